@@ -12,6 +12,7 @@ setup(
     package_dir={'': 'src/python'},
     install_requires=[
         'tables',
+        'numexpr',
         'scipy',
         'typing',
         'arrow',
@@ -2,7 +2,7 @@ import click
 
 
 class CLI(click.MultiCommand):
-    commands = {'zoo': None}
+    commands = {'zoo': None, 'dataset': None}
 
     def __init__(self):
         super().__init__(name='dxlearn',
@@ -12,11 +12,14 @@ class CLI(click.MultiCommand):
         return sorted(self.commands.keys())
 
     def get_command(self, ctx, name):
-        from dxl.learn.zoo.cli import zoo
         if name in self.commands:
             if self.commands[name] is None:
-                mapping = {'zoo': zoo}
-                self.commands[name] = mapping.get(name)
+                if name == 'zoo':
+                    from dxl.learn.zoo.cli import zoo
+                    self.commands[name] = zoo
+                elif name == 'dataset':
+                    from dxl.learn.dataset.cli import dataset
+                    self.commands[name] = dataset
         return self.commands.get(name)
 
 
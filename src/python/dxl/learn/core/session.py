@@ -103,11 +103,14 @@ class SessionBase(ConfigurableWithName):
 
     def _post_session_created(self):
         from ..distribute import DefaultCluster, ThisHost
+        from ..dataset.resumable import initialize_resumable_datasets
         if self.config(self.KEYS.CONFIG.IS_RUN_VAR_INIT):
             if DefaultCluster.cluster() is None:
                 self.run(tf.global_variables_initializer())
             elif ThisHost.is_master():
                 self.run(tf.global_variables_initializer())
+            # iterators are local to each host, thus initialized on all hosts
+            initialize_resumable_datasets(self)
 
     def session(self):
         if self._raw_session is None:
@@ -183,8 +186,10 @@ class Session(SessionBase):
         ThisSession.reset()
 
     def init(self):
+        from ..dataset.resumable import initialize_resumable_datasets
         ThisSession.run(tf.global_variables_initializer())
         ThisSession.run(tf.local_variables_initializer())
+        initialize_resumable_datasets(ThisSession)
 
 
 class ThisSession:
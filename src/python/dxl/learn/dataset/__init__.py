@@ -34,7 +34,18 @@ A typical example is
 """
 from .data_column import (ListColumns, PyTablesColumns, DataColumns,
                           HDF5DataColumns, NPYDataColumns, NPZDataColumns,
-                          RangeColumns, DataColumnsPartition)
-from .partitioner import CrossValidatePartitioner, Train80Partitioner
+                          RangeColumns, DataColumnsPartition, CachedColumns,
+                          JointDataColumns)
+from .partitioner import (CrossValidatePartitioner, Train80Partitioner,
+                          ShufflePartitioner, BlockShufflePartitioner,
+                          WorkerShardPartitioner, WeightedPartitioner,
+                          StratifiedCrossValidatePartitioner)
+from .permutation import FeistelPermutation
+from .chunk_cache import ChunkCache
+from .file_pool import FileHandlePool, default_pool
+from .parallel import ParallelColumnsIterator, ParallelColumns
+from .sharded import ShardedColumns
+from .filtered import FilteredColumns
+from .shared import SharedColumns
 # from .dataset import Dataset, DatasetFromColumns, DatasetFromColumnsV2
 # from .api import get_dataset
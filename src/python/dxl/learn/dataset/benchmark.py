@@ -0,0 +1,322 @@
+"""
+Throughput benchmark of dataset input pipelines.
+
+Synthetic HDF5, PyTables and NPY fixtures are created, then each stage of
+`DatasetFromColumns`, `DatasetFromColumnsV2` and `PytableReader.to_dataset`
+is measured separately: stages are prefixes of pipeline, e.g. `shuffle` runs
+read, convert and shuffle, thus cost of one stage is the difference to its
+previous one. Unbatched stages are fetched in groups of batch size. For each
+stage samples per second and latency percentiles of fetching one element (or
+group) are reported as JSON, e.g.
+
+```
+python -m dxl.learn.dataset.benchmark --nb-samples 4096 -o baseline.json
+```
+
+```
+{"DatasetFromColumns": {"hdf5": {"pipeline": "batched", "stages": {"read":
+    {"nb_samples": 3200, "samples_per_second": 151230.2,
+     "latency_ms": {"p50": 0.19, "p90": 0.23, "p99": 0.41, "max": 0.52}}, ...
+```
+"""
+import json
+import os
+import tempfile
+import time
+from typing import NamedTuple
+
+import click
+import h5py
+import numpy as np
+import tables as tb
+import tensorflow as tf
+
+from .data_column import (HDF5DataColumns, NPYDataColumns, PyTablesColumns,
+                          PytableReader)
+from .dataset import (ColumnsToTensorFlowDataset, DatasetFromColumns,
+                      DatasetFromColumnsV2, StandardProcessing)
+
+FIXTURES = ('hdf5', 'pytables', 'npy')
+PERCENTILES = (50, 90, 99)
+NB_WARMUP = 2
+
+
+def make_fixtures(directory, nb_samples=4096, shape=(32, 32), chunk_size=64):
+    """
+    Write synthetic fixtures of `nb_samples` float32 `x` of `shape` and int64
+    `y` into `directory`, returns dict from fixture name to file path.
+    """
+    rng = np.random.RandomState(0)
+    x = rng.rand(nb_samples, *shape).astype(np.float32)
+    y = np.arange(nb_samples, dtype=np.int64)
+    paths = {k: os.path.join(str(directory), 'benchmark.{}'.format(k))
+             for k in FIXTURES}
+    with h5py.File(paths['hdf5'], 'w') as fout:
+        fout.create_dataset('x', data=x, chunks=(chunk_size, ) + tuple(shape))
+        fout.create_dataset('y', data=y, chunks=(chunk_size, ))
+
+    class Row(tb.IsDescription):
+        x = tb.Float32Col(shape=tuple(shape))
+        y = tb.Int64Col()
+
+    with tb.open_file(paths['pytables'], 'w') as fout:
+        table = fout.create_table(fout.root, 'data', Row,
+                                  expectedrows=nb_samples)
+        rows = np.empty(nb_samples, dtype=table.dtype)
+        rows['x'], rows['y'] = x, y
+        table.append(rows)
+    with open(paths['npy'], 'wb') as fout:
+        np.save(fout, x)
+    return paths
+
+
+def open_fixture(name, path):
+    if name == 'hdf5':
+        return HDF5DataColumns(path)
+    if name == 'pytables':
+        return PyTablesColumns(path, '/data')
+    if name == 'npy':
+        return NPYDataColumns(path, mmap_mode='r')
+    raise ValueError("Unknown fixture {}.".format(name))
+
+
+def _nb_samples(element):
+    if isinstance(element, dict):
+        element = next(iter(element.values()))
+    elif isinstance(element, (tuple, list)):
+        element = element[0]
+    return len(element)
+
+
+def summarize(latencies, nb_samples):
+    latencies = np.asarray(latencies)
+    return {
+        'nb_samples': int(nb_samples),
+        'samples_per_second': float(nb_samples / max(latencies.sum(), 1e-12)),
+        'latency_ms': dict(
+            [('p{}'.format(p), float(np.percentile(latencies, p) * 1e3))
+             for p in PERCENTILES] + [('max', float(latencies.max() * 1e3))]),
+    }
+
+
+def time_calls(next_element, nb_elements, nb_samples_of=None):
+    """
+    Time `nb_elements` calls of `next_element` after `NB_WARMUP` calls.
+    `nb_samples_of`: number of samples of an element, default 1.
+    """
+    for _ in range(NB_WARMUP):
+        next_element()
+    latencies, nb_samples = [], 0
+    for _ in range(nb_elements):
+        start = time.perf_counter()
+        element = next_element()
+        latencies.append(time.perf_counter() - start)
+        nb_samples += 1 if nb_samples_of is None else nb_samples_of(element)
+    return summarize(latencies, nb_samples)
+
+
+def time_python(make_iterator, nb_elements):
+    """
+    Time Python iterator of batches, restarted by `make_iterator` when
+    exhausted.
+    """
+    state = {'it': make_iterator()}
+
+    def next_element():
+        try:
+            return next(state['it'])
+        except StopIteration:
+            state['it'] = make_iterator()
+            return next(state['it'])
+
+    return time_calls(next_element, nb_elements, _nb_samples)
+
+
+def time_dataset(make_dataset, nb_elements, fetch_batch_size=None):
+    """
+    Time fetching elements of (repeated) `make_dataset()` in a new graph.
+    `fetch_batch_size`: if not None, elements are fetched in groups of this
+    size, which amortizes `Session.run` overhead of unbatched stages.
+    """
+    with tf.Graph().as_default():
+        dataset = make_dataset().repeat()
+        if fetch_batch_size is not None:
+            dataset = dataset.batch(fetch_batch_size)
+        x = tf.compat.v1.data.make_one_shot_iterator(dataset).get_next()
+        with tf.compat.v1.Session() as sess:
+            return time_calls(lambda: sess.run(x), nb_elements, _nb_samples)
+
+
+def time_tensors(make_tensors, nb_elements):
+    with tf.Graph().as_default():
+        tensors = make_tensors()
+        with tf.compat.v1.Session() as sess:
+            return time_calls(lambda: sess.run(tensors), nb_elements,
+                              _nb_samples)
+
+
+def _unbox(tensors):
+    return {k: getattr(v, 'data', v) for k, v in tensors.items()}
+
+
+def benchmark_dataset_from_columns(columns, name, batch_size, nb_elements):
+    def make(**kwargs):
+        return DatasetFromColumns(
+            'benchmark/{}'.format(name),
+            columns,
+            batch_size=batch_size,
+            is_shuffle=True,
+            **kwargs)
+
+    d = make()
+    stages = {
+        'read':
+        time_python(lambda: iter(columns.iter_batches(batch_size)),
+                    nb_elements),
+        'convert':
+        time_dataset(d._make_dataset_object, nb_elements, batch_size),
+        'shuffle':
+        time_dataset(
+            lambda: d._make_dataset_object().shuffle(batch_size * 4),
+            nb_elements, batch_size),
+        'batch':
+        time_dataset(lambda: d._process_dataset(d._make_dataset_object()),
+                     nb_elements),
+    }
+
+    def fetch():
+        d = make()
+        d.make()
+        return _unbox(d.tensors)
+
+    stages['fetch'] = time_tensors(fetch, nb_elements)
+    return {'pipeline': d.pipeline, 'stages': stages}
+
+
+class _DataclassColumns:
+    """
+    Columns interface of `DatasetFromColumnsV2` (dataclass, dtypes and tuple
+    samples) over `DataColumns` with dict samples.
+    """
+
+    def __init__(self, columns):
+        self._columns = columns
+        names = tuple(columns.columns)
+        shapes = dict(columns.shapes)
+        self.dataclass = NamedTuple('Sample', [(k, np.ndarray) for k in names])
+        self.dataclass.shapes = staticmethod(lambda: shapes)
+        self.dtypes = dict(columns.types)
+        self.capacity = columns.capacity
+
+    def __iter__(self):
+        fields = self.dataclass._fields
+        for sample in self._columns:
+            yield tuple(sample[k] for k in fields)
+
+
+def benchmark_dataset_from_columns_v2(columns, name, batch_size, nb_elements):
+    columns = _DataclassColumns(columns)
+    processing = StandardProcessing(batch_size, None, True)
+    stages = {
+        'convert':
+        time_dataset(lambda: ColumnsToTensorFlowDataset(True)(columns),
+                     nb_elements, batch_size),
+        'batch':
+        time_dataset(
+            lambda: processing(ColumnsToTensorFlowDataset(True)(columns)),
+            nb_elements),
+    }
+
+    def fetch():
+        d = DatasetFromColumnsV2(
+            'benchmark_v2/{}'.format(name),
+            columns,
+            batch_size=batch_size,
+            is_shuffle=True)
+        d.make()
+        return _unbox(d.tensors)
+
+    stages['fetch'] = time_tensors(fetch, nb_elements)
+    return {'pipeline': 'generator', 'stages': stages}
+
+
+def benchmark_pytable_reader(path, batch_size, nb_elements):
+    with PytableReader(path) as reader:
+        reader.get_h5_to_table('/data')
+        stages = {
+            'convert':
+            time_dataset(lambda: reader.to_dataset('data'), nb_elements,
+                         batch_size),
+            'batch':
+            time_dataset(
+                lambda: reader.process_dataset(
+                    reader.to_dataset('data'),
+                    is_shuffle=True,
+                    batch_size=batch_size), nb_elements),
+        }
+    return {'pipeline': 'generator', 'stages': stages}
+
+
+def run_benchmark(directory,
+                  nb_samples=4096,
+                  shape=(32, 32),
+                  batch_size=32,
+                  nb_elements=100):
+    paths = make_fixtures(directory, nb_samples, shape)
+    result = {
+        'config': {
+            'nb_samples': nb_samples,
+            'shape': list(shape),
+            'batch_size': batch_size,
+            'nb_elements': nb_elements,
+        },
+        'DatasetFromColumns': {},
+        'DatasetFromColumnsV2': {},
+    }
+    for name in FIXTURES:
+        columns = open_fixture(name, paths[name])
+        try:
+            result['DatasetFromColumns'][name] = (
+                benchmark_dataset_from_columns(columns, name, batch_size,
+                                               nb_elements))
+            result['DatasetFromColumnsV2'][name] = (
+                benchmark_dataset_from_columns_v2(columns, name, batch_size,
+                                                  nb_elements))
+        finally:
+            if hasattr(columns, 'close'):
+                columns.close()
+    result['PytableReader'] = {
+        'pytables':
+        benchmark_pytable_reader(paths['pytables'], batch_size, nb_elements)
+    }
+    return result
+
+
+@click.command()
+@click.option('--output', '-o', type=click.Path(), default=None,
+              help='JSON output file, default to stdout.')
+@click.option('--directory', '-d', type=click.Path(), default=None,
+              help='Directory of fixtures, default to a temporary one.')
+@click.option('--nb-samples', type=int, default=4096)
+@click.option('--shape', default='32,32', help='Shape of one sample.')
+@click.option('--batch-size', type=int, default=32)
+@click.option('--nb-elements', type=int, default=100,
+              help='Number of timed elements of each stage.')
+def benchmark(output, directory, nb_samples, shape, batch_size, nb_elements):
+    """
+    Measure throughput of each stage of dataset pipelines.
+    """
+    shape = tuple(int(s) for s in shape.split(','))
+    with tempfile.TemporaryDirectory() as tmp:
+        result = run_benchmark(directory or tmp, nb_samples, shape,
+                               batch_size, nb_elements)
+    content = json.dumps(result, indent=2)
+    if output is None:
+        click.echo(content)
+    else:
+        with open(output, 'w') as fout:
+            fout.write(content)
+
+
+if __name__ == '__main__':
+    benchmark()
@@ -0,0 +1,124 @@
+"""
+Chunk aware reading of HDF5 datasets.
+
+Compressed HDF5 datasets are decoded chunk by chunk, reading samples one by one
+in shuffled order decodes the same chunk again for each sample in it.
+`ChunkedReader` groups requested indices by chunk, reads and decodes each chunk
+once, and keeps decoded chunks in a `ChunkCache` bounded by bytes.
+
+```Python
+cache = ChunkCache(max_bytes=512 * 2**20)
+columns = HDF5DataColumns('phantoms.h5', chunk_cache=cache)
+batch = columns.get_batch(indices)
+>>> cache.stats()
+{'hits': 120, 'misses': 8, 'nb_bytes': 8388608, 'nb_bytes_loaded': 8388608, 'nb_chunks': 8}
+```
+"""
+from collections import OrderedDict
+
+import numpy as np
+
+DEFAULT_CACHE_BYTES = 256 * 2**20
+DEFAULT_BLOCK_BYTES = 2**20
+
+
+class ChunkCache:
+    """
+    LRU cache of decoded chunks, total size of cached chunks is bounded by
+    `max_bytes`. Could be shared by multiple readers.
+    """
+
+    def __init__(self, max_bytes=DEFAULT_CACHE_BYTES):
+        self.max_bytes = max_bytes
+        self._chunks = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self.nb_bytes = 0
+        self.nb_bytes_loaded = 0
+
+    def get(self, key):
+        chunk = self._chunks.get(key)
+        if chunk is None:
+            self.misses += 1
+            return None
+        self._chunks.move_to_end(key)
+        self.hits += 1
+        return chunk
+
+    def put(self, key, chunk):
+        self.nb_bytes_loaded += chunk.nbytes
+        if chunk.nbytes > self.max_bytes:
+            return
+        if key in self._chunks:
+            self.nb_bytes -= self._chunks.pop(key).nbytes
+        self._chunks[key] = chunk
+        self.nb_bytes += chunk.nbytes
+        while self.nb_bytes > self.max_bytes:
+            _, evicted = self._chunks.popitem(last=False)
+            self.nb_bytes -= evicted.nbytes
+
+    def clear(self):
+        self._chunks.clear()
+        self.nb_bytes = 0
+
+    def stats(self):
+        return {
+            'hits': self.hits,
+            'misses': self.misses,
+            'nb_bytes': self.nb_bytes,
+            'nb_bytes_loaded': self.nb_bytes_loaded,
+            'nb_chunks': len(self._chunks),
+        }
+
+    def __len__(self):
+        return len(self._chunks)
+
+
+class ChunkedReader:
+    """
+    Read planner of one HDF5 dataset along its first (sample) dimension.
+
+    Blocks are aligned to dataset chunks, thus each block read decodes every
+    chunk in it exactly once. For contiguous datasets blocks of about
+    `DEFAULT_BLOCK_BYTES` are used.
+    """
+
+    def __init__(self, dataset, cache):
+        self._dataset = dataset
+        self._cache = cache
+        self._key = (dataset.file.filename, dataset.name)
+        self.block_size = self._block_size(dataset)
+
+    @classmethod
+    def _block_size(cls, dataset):
+        if dataset.chunks is not None:
+            return dataset.chunks[0]
+        nb_bytes_sample = dataset.dtype.itemsize * int(
+            np.prod(dataset.shape[1:]))
+        return max(1, DEFAULT_BLOCK_BYTES // max(1, nb_bytes_sample))
+
+    def _load_block(self, b):
+        key = self._key + (b, )
+        block = self._cache.get(key)
+        if block is None:
+            start = b * self.block_size
+            stop = min(start + self.block_size, self._dataset.shape[0])
+            block = self._dataset[start:stop]
+            self._cache.put(key, block)
+        return block
+
+    def read(self, indices):
+        indices = np.asarray(indices, dtype=np.int64)
+        result = np.empty(
+            (indices.size, ) + tuple(self._dataset.shape[1:]),
+            dtype=self._dataset.dtype)
+        if indices.size == 0:
+            return result
+        blocks = indices // self.block_size
+        order = np.argsort(blocks, kind='stable')
+        splits = np.flatnonzero(np.diff(blocks[order])) + 1
+        for group in np.split(order, splits):
+            b = int(blocks[group[0]])
+            result[group] = self._load_block(b)[indices[group] -
+                                                b * self.block_size]
+        return result
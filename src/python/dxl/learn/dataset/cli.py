@@ -0,0 +1,51 @@
+import click
+import numpy as np
+
+
+@click.group()
+def dataset():
+    """
+    Dataset tools.
+    """
+    pass
+
+
+@dataset.command()
+@click.argument('sources', nargs=-1, type=click.Path(exists=True))
+@click.option('--output', '-o', type=click.Path(), required=True,
+              help='Directory of shards and statistics.')
+@click.option('--fields', '-f', default='sinogram',
+              help='Comma separated fields, e.g. sinogram,phantom.')
+@click.option('--table', default='/data', help='Path of table in sources.')
+@click.option('--shard-size', type=int, default=4096)
+@click.option('--block-size', type=int, default=64,
+              help='Number of samples processed and written at a time.')
+@click.option('--nb-workers', '-j', type=int, default=None,
+              help='Number of worker processes, default to number of cpus.')
+@click.option('--float16', is_flag=True, help='Save float fields as float16.')
+def preprocess(sources, output, fields, table, shard_size, block_size,
+               nb_workers, float16):
+    """
+    Preprocess analytical phantom sinograms into shards.
+
+    SOURCES are sinogram and recon files, default to configured ones.
+    """
+    from .preprocess import STAT_OFFSETS, preprocess as run
+    from .raw.analytical_phantom_sinogram import _h5files, _post_processing
+    statistics = run(sources or _h5files(),
+                     [f for f in fields.split(',') if f],
+                     output,
+                     _post_processing,
+                     table=table,
+                     shard_size=shard_size,
+                     block_size=block_size,
+                     nb_workers=nb_workers,
+                     dtype=np.float16 if float16 else np.float32,
+                     stat_offsets=STAT_OFFSETS)
+    for k in sorted(statistics):
+        if k.endswith('_STAT'):
+            click.echo('{}: {}'.format(k, statistics[k]))
+
+
+from .benchmark import benchmark
+dataset.add_command(benchmark)
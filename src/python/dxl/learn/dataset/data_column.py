@@ -1,6 +1,10 @@
 """
 DataColumns, a representation of table-like data.
 """
+import json
+import os
+import struct
+import zipfile
 import h5py
 import tables as tb
 import numpy as np
@@ -8,8 +12,11 @@ from typing import Dict, Iterable
 from dxl.fs import Path
 import tensorflow as tf
 from dxl.data.io import load_npz
+from .schema import Schema, cached_schema
 from typing import Tuple, TypeVar
 
+DEFAULT_COLUMN_BLOCK_SIZE = 65536
+
 
 class DataColumns:
     """
@@ -32,10 +39,9 @@ class DataColumns:
 
     @property
     def capacity(self):
-        if self._capacity_cache is not None:
-            return self._capacity_cache
-        else:
-            return self._calculate_capacity()
+        if self._capacity_cache is None:
+            self._capacity_cache = self._calculate_capacity()
+        return self._capacity_cache
 
     @property
     def shapes(self):
@@ -45,9 +51,101 @@ class DataColumns:
     def types(self):
         raise NotImplementedError
 
+    @property
+    def block_size(self):
+        """
+        Number of samples in one storage chunk of underlying file, thus the
+        unit of efficient reading. None if unknown.
+        """
+        return None
+
     def _make_iterator(self):
         raise NotImplementedError
 
+    def get_batch(self, indices):
+        """
+        Returns samples of `indices` (a slice or a sequence of ints) stacked
+        along a new leading batch dimension.
+        """
+        raise NotImplementedError
+
+    def iter_batches(self, batch_size, drop_remainder=False):
+        """
+        Iterator of pre-batched blocks, each a stacked batch of at most
+        `batch_size` samples.
+        """
+        def it():
+            samples = []
+            for s in self:
+                samples.append(s)
+                if len(samples) == batch_size:
+                    yield _stack_samples(samples)
+                    samples = []
+            if len(samples) > 0 and not drop_remainder:
+                yield _stack_samples(samples)
+
+        return it()
+
+    def read_column(self, name):
+        """
+        All values of column `name`, read in blocks and keeping only that
+        column, thus other columns are never held in memory as a whole.
+        """
+        blocks = [
+            np.asarray(b[name])
+            for b in self.iter_batches(self.block_size
+                                       or DEFAULT_COLUMN_BLOCK_SIZE)
+        ]
+        if len(blocks) == 0:
+            return np.zeros([0])
+        return np.concatenate(blocks)
+
+    def materialize(self, path, batch_size=1024):
+        """
+        Write all samples (after any processing done by this columns) into
+        directory `path`, one fixed dtype .npy file per column plus a JSON
+        manifest, and returns a `CachedColumns` memory mapping it.
+
+        Non-dict samples are saved as column `CachedColumns.K.DATA`.
+        """
+        os.makedirs(str(path), exist_ok=True)
+        capacity = self.capacity
+        arrays, manifest, offset = {}, {}, 0
+        for batch in self.iter_batches(batch_size):
+            if not isinstance(batch, dict):
+                batch = {CachedColumns.K.DATA: batch}
+            if offset == 0:
+                for k, v in batch.items():
+                    file_name = '{}.npy'.format(k.replace('/', '.'))
+                    arrays[k] = np.lib.format.open_memmap(
+                        os.path.join(str(path), file_name),
+                        mode='w+',
+                        dtype=v.dtype,
+                        shape=(capacity, ) + v.shape[1:])
+                    manifest[k] = {
+                        'file': file_name,
+                        'dtype': v.dtype.str,
+                        'shape': list(v.shape[1:])
+                    }
+            nb_samples = len(next(iter(batch.values())))
+            if offset + nb_samples > capacity:
+                raise ValueError(
+                    "More samples than capacity {}.".format(capacity))
+            for k, v in batch.items():
+                arrays[k][offset:offset + nb_samples] = v
+            offset += nb_samples
+        if offset != capacity:
+            raise ValueError("Got {} samples, while capacity is {}.".format(
+                offset, capacity))
+        for a in arrays.values():
+            a.flush()
+        with open(os.path.join(str(path), CachedColumns.MANIFEST), 'w') as fout:
+            json.dump({
+                'capacity': capacity,
+                'columns': manifest
+            }, fout, indent=4)
+        return CachedColumns(path)
+
     def __next__(self):
         if self._iterator is None:
             self._iterator = iter(self)
@@ -62,12 +160,24 @@ class DataColumnsPartition(DataColumns):
         super().__init__(data)
         self._partitioner = partitioner
 
+    @property
+    def partitioner(self):
+        return self._partitioner
+
     def _make_iterator(self):
         return self._partitioner.partition(self.data)
 
     def _calculate_capacity(self):
         return self._partitioner.get_capacity(self.data)
 
+    def get_batch(self, indices):
+        positions = _as_indices(indices, self.capacity)
+        return self.data.get_batch(self._partitioner.take(self.data, positions))
+
+    def iter_batches(self, batch_size, drop_remainder=False):
+        return self._partitioner.partition_batches(self.data, batch_size,
+                                                   drop_remainder)
+
     @property
     def shapes(self):
         return self.data.shapes
@@ -88,6 +198,21 @@ class DataColumnsWithGetItem(DataColumns):
     def __getitem__(self, i):
         raise NotImplementedError
 
+    def get_batch(self, indices):
+        return _stack_samples(
+            [self[i] for i in _as_indices(indices, self.capacity)])
+
+    def iter_batches(self, batch_size, drop_remainder=False):
+        def it():
+            capacity = self.capacity
+            for start in range(0, capacity, batch_size):
+                stop = min(start + batch_size, capacity)
+                if drop_remainder and stop - start < batch_size:
+                    return
+                yield self.get_batch(slice(start, stop))
+
+        return it()
+
 
 class RangeColumns(DataColumnsWithGetItem):
     def __init__(self, nb_samples):
@@ -107,26 +232,65 @@ class RangeColumns(DataColumnsWithGetItem):
     def __getitem__(self, i):
         return i
 
+    def get_batch(self, indices):
+        return _as_indices(indices, self.capacity)
 
-class JointDataColumns(DataColumns):
-    def __init__(self, data, name_map):
-        super().__init__(data)
+
+class JointDataColumns(DataColumnsWithGetItem):
+    """
+    Joined view of several DataColumns of the same capacity.
+
+    `name_map` is a list of dicts, one for each of `data`, maps names of
+    columns in that source to names in joined columns. Only mapped columns
+    are read. If `name_map` is None, all columns are joined with their own
+    names.
+    """
+
+    def __init__(self, data, name_map=None):
+        super().__init__(tuple(data))
+        if name_map is None:
+            name_map = [{k: k for k in d.columns} for d in self.data]
+        if len(name_map) != len(self.data):
+            raise ValueError("{} name maps for {} sources.".format(
+                len(name_map), len(self.data)))
         self.name_map = name_map
+        self._mapping = tuple(tuple(m.items()) for m in name_map)
+        names = [v for m in self._mapping for _, v in m]
+        if len(set(names)) != len(names):
+            raise ValueError("Duplicated joined names in {}.".format(names))
 
-    def __getitem__(self, i):
+    @property
+    def columns(self):
+        return tuple(v for m in self._mapping for _, v in m)
+
+    def _join(self, results):
         result = {}
-        for d, m in zip(self.data, self.name_map):
-            r = d[i]
-            for k, v in r.items():
-                if k in m:
-                    result[self.name_map[k]] = v
+        for r, m in zip(results, self._mapping):
+            for k, v in m:
+                result[v] = r[k]
         return result
 
+    def __getitem__(self, i):
+        if isinstance(i, slice):
+            return self.get_batch(i)
+        return self._join([d[i] for d in self.data])
+
+    def get_batch(self, indices):
+        return self._join([d.get_batch(indices) for d in self.data])
+
+    @property
+    def types(self):
+        return self._join([d.types for d in self.data])
+
+    @property
+    def shapes(self):
+        return self._join([d.shapes for d in self.data])
+
     def _calculate_capacity(self):
-        capacities = set(d._calculate_capacity() for d in self.data)
+        capacities = set(d.capacity for d in self.data)
         if len(capacities) != 1:
             raise ValueError("Inconsistant capacities {}.".format(capacities))
-        return capacities[0]
+        return capacities.pop()
 
 
 class NDArrayColumns(DataColumnsWithGetItem):
@@ -142,10 +306,38 @@ class NDArrayColumns(DataColumnsWithGetItem):
                         "Capacity of {} is not equal to previous.".format(k))
         return result
 
+    @property
+    def types(self):
+        return {k: tf.as_dtype(self.data[k].dtype) for k in self.columns}
+
+    @property
+    def shapes(self):
+        return {k: tuple(self.data[k].shape[1:]) for k in self.columns}
+
     def __getitem__(self, i):
+        if isinstance(i, slice):
+            return self.get_batch(i)
         result = {}
         for k in self.columns:
             result[k] = self.data[k][i, ...]
+        return result
+
+    def read_column(self, name):
+        return np.asarray(self.data[name][:])
+
+    def get_batch(self, indices):
+        """
+        One fancy-index read per column. Indices are sorted and deduplicated
+        before reading since h5py only accepts increasing selections, then
+        restored to the requested order.
+        """
+        if isinstance(indices, slice):
+            return {k: self.data[k][indices] for k in self.columns}
+        selection, inverse = _sorted_selection(indices)
+        result = {}
+        for k in self.columns:
+            result[k] = np.asarray(self.data[k][selection])[inverse]
+        return result
 
 
 class ListColumns(DataColumnsWithGetItem):
@@ -165,79 +357,398 @@ class ListColumns(DataColumnsWithGetItem):
         result = {}
         for k in self.columns:
             result[k] = self.data[k][i]
+        return result
 
 
 class HDF5DataColumns(NDArrayColumns):
+    def __init__(self, data, chunk_cache=None, *, swmr=False, pool=None):
+        """
+        `chunk_cache`: optional `ChunkCache`, if provided, reads are grouped by
+        dataset chunks and decoded chunks are cached, which is much faster for
+        random access to compressed datasets.
+        `swmr`: open file in SWMR read mode, for files appended by a writer.
+        `pool`: `FileHandlePool` of file (if `data` is a path), default to
+        `default_pool()`.
+        """
+        self._chunk_cache = chunk_cache
+        self._readers = {}
+        self._schema = None
+        self._lease = None
+        self._swmr = swmr
+        self._pool = pool
+        super().__init__(data)
+
+    @property
+    def data(self):
+        if self._lease is not None:
+            return self._lease.file
+        return self._data
+
+    @data.setter
+    def data(self, value):
+        self._data = value
+
     def _process(self, data):
         if isinstance(data, (str, Path)):
-            data = h5py.File(data)
+            from .file_pool import BACKEND, default_pool
+            self._lease = (self._pool or default_pool()).open(
+                data, BACKEND.H5PY, self._swmr)
+            path_file, data = data, self._lease.file
+            self._schema = cached_schema(path_file, '/',
+                                         lambda: _hdf5_schema(data))
         return data
 
+    def _calculate_capacity(self):
+        if self._schema is not None:
+            return self._schema.capacity
+        return super()._calculate_capacity()
+
+    @property
+    def types(self):
+        if self._schema is not None:
+            return {
+                k: tf.as_dtype(v)
+                for k, v in self._schema.dtypes.items()
+            }
+        return super().types
+
+    @property
+    def shapes(self):
+        if self._schema is not None:
+            return dict(self._schema.shapes)
+        return super().shapes
+
+    def _reader(self, k):
+        # datasets of a file reopened after fork are new objects
+        key = (os.getpid(), k)
+        if key not in self._readers:
+            from .chunk_cache import ChunkedReader
+            self._readers[key] = ChunkedReader(self.data[k], self._chunk_cache)
+        return self._readers[key]
+
+    def __getitem__(self, i):
+        if self._chunk_cache is None or isinstance(i, slice):
+            return super().__getitem__(i)
+        return {k: v[0] for k, v in self.get_batch([i]).items()}
+
+    @property
+    def block_size(self):
+        from .chunk_cache import ChunkedReader
+        return max(ChunkedReader._block_size(self.data[k]) for k in self.columns)
+
+    def get_batch(self, indices):
+        if self._chunk_cache is None:
+            return super().get_batch(indices)
+        indices = _as_indices(indices, self.capacity)
+        return {k: self._reader(k).read(indices) for k in self.columns}
+
     def close(self):
-        self.data.close()
+        if self._lease is not None:
+            self._lease.close()
+        else:
+            self.data.close()
 
 
 class NPYDataColumns(NDArrayColumns):
     class K:
         DATA = 'data'
 
+    def __init__(self, data, mmap_mode=None):
+        """
+        `mmap_mode`: if not None (e.g. 'r'), file is memory mapped instead of
+        read into memory, thus opening is O(1) and pages are shared between
+        processes on the same node.
+        """
+        self._mmap_mode = mmap_mode
+        super().__init__(data)
+
     def _process(self, data):
-        return np.load(data)
+        data = np.load(str(data), mmap_mode=self._mmap_mode)
+        if isinstance(data, np.ndarray):
+            data = {self.K.DATA: data}
+        return data
 
 
 class NPZDataColumns(NDArrayColumns):
+    def __init__(self, data, mmap_mode=None):
+        """
+        `mmap_mode`: if not None (e.g. 'r'), members stored uncompressed are
+        memory mapped by their offsets in archive, compressed members are
+        still read into memory.
+        """
+        self._mmap_mode = mmap_mode
+        super().__init__(data)
+
+    def _process(self, data):
+        if self._mmap_mode is None:
+            return load_npz(data)
+        return _mmap_npz(data, self._mmap_mode)
+
+
+_NPY_HEADER_READERS = {
+    (1, 0): np.lib.format.read_array_header_1_0,
+    (2, 0): np.lib.format.read_array_header_2_0,
+}
+
+_ZIP_LOCAL_HEADER_SIZE = 30
+
+
+def _mmap_npz(path, mmap_mode):
+    """
+    Memory map members of a .npz archive. Members of uncompressed archives
+    (`np.savez`) are plain .npy files at fixed offsets, thus can be mapped
+    directly.
+    """
+    path = str(path)
+    result = {}
+    with zipfile.ZipFile(path) as zf, open(path, 'rb') as fin:
+        for info in zf.infolist():
+            name = info.filename
+            if name.endswith('.npy'):
+                name = name[:-len('.npy')]
+            array = None
+            if info.compress_type == zipfile.ZIP_STORED:
+                array = _mmap_npz_member(path, fin, info, mmap_mode)
+            if array is None:
+                with zf.open(info) as member:
+                    array = np.lib.format.read_array(member)
+            result[name] = array
+    return result
+
+
+def _mmap_npz_member(path, fin, info, mmap_mode):
+    fin.seek(info.header_offset)
+    header = fin.read(_ZIP_LOCAL_HEADER_SIZE)
+    len_name, len_extra = struct.unpack('<HH', header[26:30])
+    fin.seek(info.header_offset + _ZIP_LOCAL_HEADER_SIZE + len_name +
+             len_extra)
+    version = np.lib.format.read_magic(fin)
+    if version not in _NPY_HEADER_READERS:
+        return None
+    shape, fortran_order, dtype = _NPY_HEADER_READERS[version](fin)
+    if dtype.hasobject:
+        return None
+    return np.memmap(
+        path,
+        dtype=dtype,
+        mode=mmap_mode,
+        offset=fin.tell(),
+        shape=shape,
+        order='F' if fortran_order else 'C')
+
+
+class CachedColumns(NDArrayColumns):
+    """
+    Columns written by `DataColumns.materialize`, memory mapped by default,
+    thus opening is O(1) and reads are zero-copy.
+    """
+    MANIFEST = 'manifest.json'
+
+    class K:
+        DATA = 'data'
+
+    def __init__(self, path, mmap_mode='r'):
+        self._mmap_mode = mmap_mode
+        super().__init__(path)
+
     def _process(self, data):
-        return load_npz(data)
+        with open(os.path.join(str(data), self.MANIFEST)) as fin:
+            self._manifest = json.load(fin)
+        return {
+            k: np.load(
+                os.path.join(str(data), v['file']), mmap_mode=self._mmap_mode)
+            for k, v in self._manifest['columns'].items()
+        }
+
+    def _calculate_capacity(self):
+        return self._manifest['capacity']
+
+    @property
+    def types(self):
+        return {
+            k: tf.as_dtype(np.dtype(v['dtype']))
+            for k, v in self._manifest['columns'].items()
+        }
+
+    @property
+    def shapes(self):
+        return {
+            k: tuple(v['shape'])
+            for k, v in self._manifest['columns'].items()
+        }
 
 
 class PyTablesColumns(DataColumnsWithGetItem):
-    def __init__(self, path_file, path_dataset):
+    def __init__(self, path_file, path_dataset, columns=None, *, pool=None):
+        """
+        `columns`: optional subset of table columns, only these fields are read,
+        which saves bytes read and copied when only some fields are used.
+        `pool`: `FileHandlePool` of file, default to `default_pool()`.
+        """
+        if isinstance(columns, str):
+            columns = (columns, )
+        self._selected_columns = tuple(
+            columns) if columns is not None else None
+        self._pool = pool
+        self._nodes = None
         super().__init__((path_file, path_dataset))
 
     def _process(self, data):
+        from .file_pool import BACKEND, default_pool
         path_file, path_dataset = data
-        self._file = tb.open_file(str(path_file))
-        self._node = self._file.get_node(path_dataset)
+        self._path_dataset = path_dataset
+        self._lease = (self._pool or default_pool()).open(
+            path_file, BACKEND.TABLES)
+        self._schema = cached_schema(path_file, self._node._v_pathname,
+                                     lambda: _table_schema(self._node))
+        if self._selected_columns is not None:
+            unknown = set(self._selected_columns) - set(self._node.colnames)
+            if len(unknown) > 0:
+                self._lease.close()
+                raise ValueError("Columns {} not found in {}.".format(
+                    unknown, path_dataset))
+
+    @property
+    def _file(self):
+        return self._lease.file
+
+    @property
+    def _node(self):
+        # nodes of a file reopened after fork are new objects
+        f = self._file
+        if self._nodes is None or self._nodes[0] is not f:
+            self._nodes = (f, f.get_node(self._path_dataset))
+        return self._nodes[1]
+
+    @property
+    def block_size(self):
+        if self._node.chunkshape is None:
+            return None
+        return self._node.chunkshape[0]
+
+    def _is_projected(self):
+        return (self._selected_columns is not None
+                and len(self._selected_columns) < len(self._node.colnames))
 
     def __getitem__(self, i):
+        if isinstance(i, slice):
+            return self.get_batch(i)
+        if self._is_projected():
+            return {
+                k: np.array(self._node.read(i, i + 1, field=k)[0])
+                for k in self.columns
+            }
         result = {}
         data = self._node[i]
         for k in self.columns:
             result[k] = np.array(data[k])
         return result
 
+    def get_batch(self, indices):
+        """
+        Struct of arrays batch read by `Table.read` for contiguous blocks and
+        `Table.read_coordinates` otherwise. Projected columns are read field by
+        field, otherwise rows are read once and split into fields.
+        """
+        if isinstance(indices, slice) and indices.step in (None, 1):
+            start, stop, _ = indices.indices(self.capacity)
+            selection, inverse = slice(start, stop), None
+        else:
+            selection, inverse = _sorted_selection(
+                _as_indices(indices, self.capacity))
+        if self._is_projected():
+            result = {k: self._read(selection, k) for k in self.columns}
+        else:
+            rows = self._read(selection)
+            result = {k: rows[k] for k in self.columns}
+        if inverse is not None:
+            result = {k: v[inverse] for k, v in result.items()}
+        return result
+
+    def read_column(self, name):
+        return self._node.read(field=name)
+
+    def _read(self, selection, field=None):
+        if isinstance(selection, slice):
+            return self._node.read(selection.start, selection.stop, field=field)
+        return self._node.read_coordinates(selection, field=field)
+
     @property
     def columns(self):
+        if self._selected_columns is not None:
+            return self._selected_columns
         return tuple(self._node.colnames)
 
     @property
     def types(self):
         result = {}
-        coltypes = self._node.coltypes
-        for k, v in coltypes.items():
-            result.update({k: tf.as_dtype(v)})
+        for k in self.columns:
+            result.update({k: tf.as_dtype(self._schema.dtypes[k])})
             # result.update({k: tf.float32})
         return result
 
     @property
     def shapes(self):
         result = {}
-        coldescrs = self._node.coldescrs
-        for k, v in coldescrs.items():
-            result.update({k: v.shape})
+        for k in self.columns:
+            result.update({k: self._schema.shapes[k]})
         return result
 
     def _calculate_capacity(self):
-        return self._node.shape[0]
+        return self._schema.capacity
 
     def close(self):
-        self._file.close()
+        self._lease.close()
 
 
 class ColumnsWithIndex:
     pass
 
 
+def _as_indices(indices, capacity):
+    if isinstance(indices, slice):
+        return np.arange(*indices.indices(capacity))
+    return np.asarray(indices, dtype=np.int64)
+
+
+def _hdf5_schema(h5file):
+    datasets = {k: v for k, v in h5file.items() if isinstance(v, h5py.Dataset)}
+    capacities = set(v.shape[0] for v in datasets.values())
+    if len(capacities) > 1:
+        raise ValueError("Inconsistant capacities {}.".format(capacities))
+    return Schema(
+        capacities.pop() if capacities else 0,
+        {k: v.dtype
+         for k, v in datasets.items()}, {k: v.shape[1:]
+                                         for k, v in datasets.items()})
+
+
+def _table_schema(table):
+    return Schema(table.nrows,
+                  {k: v.base
+                   for k, v in table.coldtypes.items()},
+                  {k: v.shape
+                   for k, v in table.coldescrs.items()})
+
+
+def _sorted_selection(indices):
+    """
+    Increasing, deduplicated selection of `indices` (a slice if contiguous),
+    and the inverse index array restoring requested order.
+    """
+    indices = np.asarray(indices, dtype=np.int64)
+    unique, inverse = np.unique(indices, return_inverse=True)
+    if unique.size > 0 and unique[-1] - unique[0] + 1 == unique.size:
+        return slice(int(unique[0]), int(unique[-1]) + 1), inverse
+    return unique, inverse
+
+
+def _stack_samples(samples):
+    if len(samples) > 0 and isinstance(samples[0], dict):
+        return {k: np.stack([s[k] for s in samples]) for k in samples[0]}
+    return np.stack(samples)
+
+
 # from dxl.data import ColumnsWithIndex
 from typing import NamedTuple, Optional, Dict
 from pathlib import Path
@@ -267,10 +778,10 @@ class PytableData:
 
     file_path: str = attr.ib()
     file: typing.Any = attr.ib(default=None)
-    table: dict = attr.ib(default={})
-    file_dataset: dict = attr.ib(default={})
+    table: dict = attr.ib(factory=dict)
+    file_dataset: dict = attr.ib(factory=dict)
     mode: str = attr.ib(default='r')
-    type_mapper: dict = attr.ib(default={
+    type_mapper: dict = attr.ib(factory=lambda: {
         np.dtype('float16'): tf.float16,
         np.dtype('float32'): tf.float32,
         np.dtype('float64'): tf.float64,
@@ -279,6 +790,8 @@ class PytableData:
         np.dtype('int32'): tf.int32,
         np.dtype('int64'): tf.int64,
     })
+    block_size: typing.Optional[int] = attr.ib(default=None)
+    lease: typing.Any = attr.ib(default=None, init=False)
 
 
 class PytableReader(PytableData):
@@ -299,6 +812,13 @@ class PytableReader(PytableData):
                 raise ValueError('dataset not found.')
 
     def open(self, file_path: str):
+        """
+        Read-only files are shared by `default_pool()`.
+        """
+        if self.mode == 'r':
+            from .file_pool import BACKEND, default_pool
+            self.lease = default_pool().open(file_path, BACKEND.TABLES)
+            return self.lease.file
         return tb.open_file(str(file_path), mode=self.mode)
 
     def __enter__(self):
@@ -306,7 +826,11 @@ class PytableReader(PytableData):
         return self
 
     def __exit__(self, exc_type, exc_val, exc_tb):
-        self.file.close()
+        if self.lease is not None:
+            self.lease.close()
+            self.lease = None
+        else:
+            self.file.close()
 
     def get_h5_to_table(self, table_dir: str, table_name=None):
         self.check(self.KEYS.ATTR.FILE)
@@ -322,43 +846,71 @@ class PytableReader(PytableData):
     def add_table_to_dic(self, table_name, table):
         self.table[table_name] = table
 
-    def make_iterator(self, table):
+    def get_block_size(self, table):
+        """
+        Number of rows of one `table.read`, default to `table.nrowsinbuf`,
+        the I/O buffer size of PyTables, which is aligned to chunks.
+        """
+        return self.block_size or table.nrowsinbuf
+
+    def make_block_iterator(self, table):
+        """
+        Returns a generator function, each call of which reads `table` by
+        blocks of `get_block_size(table)` rows, and yields tuples of columns
+        (in order of `table.colnames`) with a leading batch dimension.
+        """
         self.check(table.name, self.KEYS.MARK.TABLE)
-        it = table.iterrows()
-        col_name = table.colnames
-        col_num = len(col_name)
+        names = table.colnames
+        block_size = self.get_block_size(table)
+
+        def iterator():
+            for start in range(0, table.nrows, block_size):
+                rows = table.read(start, min(start + block_size, table.nrows))
+                yield tuple(rows[name] for name in names)
+
+        return iterator
+
+    def make_iterator(self, table):
+        blocks = self.make_block_iterator(table)
 
         def iterator():
-            for row in it:
-                res = []
-                for col in range(col_num):
-                    res.append(row[col])
-                yield tuple(res)
+            for block in blocks():
+                for i in range(len(block[0])):
+                    yield tuple(column[i] for column in block)
 
         return iterator
 
     def map_to_tf_type(self, ntype: np.dtype):
         return self.type_mapper[ntype]
 
-    def get_type_and_shape(self, table):
+    def get_type_and_shape(self, table, is_batched=False):
+        schema = cached_schema(table._v_file.filename, table._v_pathname,
+                               lambda: _table_schema(table))
         res_types = []
         res_shapes = []
         for name in table.colnames:
-            res_type = table.col(name)[0].dtype
-            res_shape = table.col(name)[0].shape
-            res_shape = tf.TensorShape(list(res_shape))
+            res_type = schema.dtypes[name]
+            res_shape = schema.shapes[name]
+            res_shape = tf.TensorShape(
+                ([None] if is_batched else []) + list(res_shape))
             res_type = self.map_to_tf_type(res_type)
             # print(res_type)
             res_types.append(res_type)
             res_shapes.append(res_shape)
         return tuple(res_types), tuple(res_shapes)
 
-    def to_dataset(self, table_name: str):
+    def to_dataset(self, table_name: str, is_batched=False):
+        """
+        Dataset of rows of table, read by blocks. If `is_batched`, elements are
+        the blocks, with a leading batch dimension.
+        """
         self.check(table_name, self.KEYS.MARK.TABLE)
         table = self.retrieve_table(table_name)
-        it = self.make_iterator(table)
-        table_type, table_shape = self.get_type_and_shape(table)
+        it = self.make_block_iterator(table)
+        table_type, table_shape = self.get_type_and_shape(table, True)
         dataset = tf.data.Dataset.from_generator(it, table_type, table_shape)
+        if not is_batched:
+            dataset = dataset.apply(tf.data.experimental.unbatch())
         self.add_dataset_to_dic(table_name, dataset)
         return self.retrieve_dataset(table_name)
 
@@ -6,10 +6,90 @@ from .partitioner import Partitioner
 import tensorflow as tf
 
 RATIO_SHUFFLE_BUFFER_TO_BATCH_SIZE = 4
+DEFAULT_READ_BATCH_SIZE = 256
+# let tf.data tune parallelism and buffer sizes at runtime
+AUTOTUNE = tf.data.experimental.AUTOTUNE
 
-# from dxl.learn.function import Function, function, MapIf, NestMapOf, shape_list, To
+from dxl.data.function import Function, function, MapIf, NestMapOf, shape_list, To
+from dxl.learn.utils.logger import logger
 from doufo.tensor import Tensor
 from typing import Union, NamedTuple
+import hashlib
+import json
+import os
+import re
+import numpy as np
+
+
+class PIPELINE:
+    TENSOR_SLICES = 'tensor_slices'
+    BATCHED = 'batched'
+    GENERATOR = 'generator'
+
+
+def _estimate_nb_bytes(types, shapes, capacity):
+    """
+    Bytes of `capacity` samples, None if size of a sample is unknown.
+    """
+    if not isinstance(types, dict):
+        types, shapes = {None: types}, {None: shapes}
+    nb_bytes = 0
+    for k, t in types.items():
+        t, shape = tf.as_dtype(t), tf.TensorShape(shapes[k])
+        if t == tf.string or not shape.is_fully_defined():
+            return None
+        nb_bytes += t.size * shape.num_elements()
+    return nb_bytes * capacity
+
+
+def _is_epoch_dependent(columns):
+    partitioner = getattr(columns, 'partitioner', None)
+    return getattr(partitioner, 'is_epoch_dependent', False)
+
+
+def choose_pipeline(columns, memory_budget=None):
+    """
+    Input pipeline of `columns`:
+    `PIPELINE.TENSOR_SLICES` if `memory_budget` is not None, all samples fit in
+    it and do not change between epochs, thus read once;
+    `PIPELINE.BATCHED` if shapes are fully defined, thus read by blocks;
+    `PIPELINE.GENERATOR` otherwise, thus read sample by sample.
+    """
+    nb_bytes = _estimate_nb_bytes(columns.types, columns.shapes,
+                                  columns.capacity)
+    if nb_bytes is None or columns.capacity == 0:
+        return PIPELINE.GENERATOR
+    if (memory_budget is not None and nb_bytes <= memory_budget
+            and not _is_epoch_dependent(columns)):
+        return PIPELINE.TENSOR_SLICES
+    return PIPELINE.BATCHED
+
+
+def _read_all(columns):
+    """
+    All samples of columns as (dict of) ndarray, casted to `columns.types`.
+    """
+    types = columns.types
+    batch = next(iter(columns.iter_batches(max(1, columns.capacity))))
+    if isinstance(batch, dict):
+        return {
+            k: np.asarray(v, tf.as_dtype(types[k]).as_numpy_dtype)
+            for k, v in batch.items()
+        }
+    return np.asarray(batch, tf.as_dtype(types).as_numpy_dtype)
+
+
+def _block_shapes(shapes):
+    """
+    Shapes of blocks of samples, with unknown leading dimension.
+    """
+    if isinstance(shapes, dict):
+        return {k: _block_shapes(v) for k, v in shapes.items()}
+    return tf.TensorShape([None] + list(shapes))
+
+
+def _is_batch_static(shape, axis=0):
+    return len(shape) > axis and shape[axis] is not None
 
 
 class Dataset(Graph):
@@ -51,6 +131,12 @@ class DatasetFromColumns(Graph):
             NB_EPOCHS = 'nb_epochs'
             BATCH_SIZE = 'batch_size'
             IS_SHUFFLE = 'is_shuffle'
+            READ_BATCH_SIZE = 'read_batch_size'
+            MEMORY_BUDGET = 'memory_budget'
+            NB_PREFETCH = 'nb_prefetch'
+            CACHE_DIR = 'cache_dir'
+            IS_RESUMABLE = 'is_resumable'
+            SEED = 'seed'
 
     def __init__(self,
                  info,
@@ -59,7 +145,31 @@ class DatasetFromColumns(Graph):
                  nb_epochs=None,
                  batch_size=None,
                  is_shuffle=None,
+                 read_batch_size=None,
+                 memory_budget=None,
+                 nb_prefetch=None,
+                 cache_dir=None,
+                 is_resumable=None,
+                 seed=None,
                  config=None):
+        """
+        Input pipeline is chosen by `choose_pipeline`:
+        columns are read in blocks of `read_batch_size` (default
+        `DEFAULT_READ_BATCH_SIZE`) samples by `columns.iter_batches`, thus one
+        Python call per block instead of per sample. If `memory_budget` (bytes)
+        is given, columns fit in it are read once into memory and sliced by
+        `from_tensor_slices` instead, note that samples are then embedded in
+        graph as constants (thus in saved meta graphs too), only use it for
+        small datasets.
+        `nb_prefetch`: number of batches prefetched, default `AUTOTUNE`.
+        `cache_dir`: if not None, samples read from columns are cached in it by
+        `Cache`, keyed by source files of columns.
+        `is_resumable`: if True, reading position is kept in `self.state`
+        (an `IteratorState` of scope `<name>/iterator_state`), which is saved
+        and restored with checkpoints, see `dataset.resumable`. Samples are
+        then shuffled by a `ShufflePartitioner` of `seed` (default 0) instead
+        of a shuffle buffer.
+        """
         self._columns = columns
         super().__init__(
             info,
@@ -67,17 +177,45 @@ class DatasetFromColumns(Graph):
                 self.KEYS.CONFIG.NB_EPOCHS: nb_epochs,
                 self.KEYS.CONFIG.BATCH_SIZE: batch_size,
                 self.KEYS.CONFIG.IS_SHUFFLE: is_shuffle,
+                self.KEYS.CONFIG.READ_BATCH_SIZE: read_batch_size,
+                self.KEYS.CONFIG.MEMORY_BUDGET: memory_budget,
+                self.KEYS.CONFIG.NB_PREFETCH: nb_prefetch,
+                self.KEYS.CONFIG.CACHE_DIR: cache_dir,
+                self.KEYS.CONFIG.IS_RESUMABLE: is_resumable,
+                self.KEYS.CONFIG.SEED: seed,
             })
 
+    def _config_or_default(self, key, default):
+        value = self.config(key)
+        return default if value is None else value
+
     def _make_dataset_object(self):
-        return tf.data.Dataset.from_generator(
-            self._columns.__iter__, self._columns.types,
-            NestMapOf(tf.TensorShape)(self._columns.shapes))
+        KC = self.KEYS.CONFIG
+        columns = self._columns
+        self.pipeline = choose_pipeline(columns,
+                                        self.config(KC.MEMORY_BUDGET))
+        logger.info("Dataset {} uses {} pipeline for {} samples.".format(
+            self.name, self.pipeline, columns.capacity))
+        if self.pipeline == PIPELINE.TENSOR_SLICES:
+            return tf.data.Dataset.from_tensor_slices(_read_all(columns))
+        if self.pipeline == PIPELINE.GENERATOR:
+            return tf.data.Dataset.from_generator(
+                columns.__iter__, columns.types,
+                NestMapOf(tf.TensorShape)(columns.shapes))
+        read_batch_size = self._config_or_default(KC.READ_BATCH_SIZE,
+                                                  DEFAULT_READ_BATCH_SIZE)
+        dataset = tf.data.Dataset.from_generator(
+            lambda: columns.iter_batches(read_batch_size),
+            columns.types,
+            _block_shapes(columns.shapes))
+        return dataset.apply(tf.data.experimental.unbatch())
 
     def _convert(self, v):
         result = Tensor(v)
         if self.config(self.KEYS.CONFIG.BATCH_SIZE) is not None:
             shape = result.data.shape.as_list()
+            if _is_batch_static(shape):
+                return result
             shape[0] = self.config(self.KEYS.CONFIG.BATCH_SIZE)
             if shape.count(None) == 1:
                 shape[shape.index(None)] = -1
@@ -90,15 +228,71 @@ class DatasetFromColumns(Graph):
             result = {self.KEYS.TENSOR.DATA: result}
         return {k: self._convert(v) for k, v in result.items()}
 
+    def _cache(self, dataset):
+        cache_dir = self.config(self.KEYS.CONFIG.CACHE_DIR)
+        if cache_dir is None or self.pipeline == PIPELINE.TENSOR_SLICES:
+            return dataset
+        from .filtered import source_key
+        if (_is_epoch_dependent(self._columns)
+                or source_key(self._columns)[1] is None):
+            logger.info("Dataset {} is not cached since its columns are not "
+                        "backed by files or change between epochs.".format(
+                            self.name))
+            return dataset
+        return Cache(
+            cache_dir,
+            self.name,
+            source=self._columns,
+            config={
+                'types': repr(self._columns.types),
+                'shapes': repr(self._columns.shapes)
+            })(dataset)
+
     def _process_dataset(self, dataset):
         KC = self.KEYS.CONFIG
+        dataset = self._cache(dataset)
         dataset = dataset.repeat(self.config(KC.NB_EPOCHS))
         if self.config(KC.IS_SHUFFLE):
             dataset = dataset.shuffle(self.config(KC.BATCH_SIZE) * 4)
         dataset = dataset.batch(self.config(KC.BATCH_SIZE))
-        return dataset
+        return dataset.prefetch(
+            self._config_or_default(KC.NB_PREFETCH, AUTOTUNE))
+
+    def _make_resumable_tensors(self):
+        from .resumable import (IteratorState, make_resumable_iterator,
+                                resumable_batches, with_shuffle)
+        KC = self.KEYS.CONFIG
+        columns = self._columns
+        if self.config(KC.IS_SHUFFLE):
+            columns = with_shuffle(columns,
+                                   self._config_or_default(KC.SEED, 0))
+        self.state = IteratorState(
+            '{}/iterator_state'.format(str(self.name).strip('/')),
+            getattr(getattr(columns, 'partitioner', None), 'seed', 0))
+        self.pipeline = PIPELINE.BATCHED
+        logger.info("Dataset {} uses resumable {} pipeline for {} samples.".
+                    format(self.name, self.pipeline, columns.capacity))
+        dataset = tf.data.Dataset.from_generator(
+            resumable_batches(
+                columns,
+                self._config_or_default(KC.READ_BATCH_SIZE,
+                                        DEFAULT_READ_BATCH_SIZE),
+                self.config(KC.NB_EPOCHS)),
+            columns.types,
+            _block_shapes(columns.shapes),
+            args=(self.state.position, self.state.seed))
+        dataset = dataset.apply(tf.data.experimental.unbatch())
+        dataset = dataset.batch(self.config(KC.BATCH_SIZE)).prefetch(
+            self._config_or_default(KC.NB_PREFETCH, AUTOTUNE))
+        result = make_resumable_iterator(dataset, self.state)
+        if not isinstance(result, dict):
+            result = {self.KEYS.TENSOR.DATA: result}
+        return {k: self._convert(v) for k, v in result.items()}
 
     def kernel(self, inputs=None):
+        if self.config(self.KEYS.CONFIG.IS_RESUMABLE):
+            self.tensors.update(self._make_resumable_tensors())
+            return
         dataset = self._make_dataset_object()
         dataset = self._process_dataset(dataset)
         self.tensors.update(self._finalize_to_dict_of_tensors(dataset))
@@ -131,6 +325,245 @@ class Shuffle(Function):
             return x.shuffle(self.nb_buffer)
 
 
+class Map(Function):
+    def __init__(self, f, num_parallel_calls=AUTOTUNE):
+        """
+        `num_parallel_calls`: number of samples processed in parallel,
+        `AUTOTUNE` or None (sequential).
+        """
+        self.f = f
+        self.num_parallel_calls = num_parallel_calls
+
+    def __call__(self, x: Union[tf.data.Dataset]):
+        if isinstance(x, tf.data.Dataset):
+            return x.map(self.f, num_parallel_calls=self.num_parallel_calls)
+        raise TypeError("Unknown type {} of x.".format(type(x)))
+
+
+class MapBatched(Function):
+    """
+    Batch first, then apply a vectorized `f` on batches, which is much cheaper
+    than per sample `Map` for small ops.
+    """
+
+    def __init__(self,
+                 f,
+                 batch_size,
+                 num_parallel_calls=AUTOTUNE,
+                 drop_remainder=False):
+        self.f = f
+        self.batch_size = batch_size
+        self.num_parallel_calls = num_parallel_calls
+        self.drop_remainder = drop_remainder
+
+    def __call__(self, x: Union[tf.data.Dataset]):
+        if isinstance(x, tf.data.Dataset):
+            return x.batch(
+                self.batch_size, drop_remainder=self.drop_remainder).map(
+                    self.f, num_parallel_calls=self.num_parallel_calls)
+        raise TypeError("Unknown type {} of x.".format(type(x)))
+
+
+class Interleave(Function):
+    """
+    Maps each element to a dataset by `f` (e.g. one shard file to its samples),
+    and interleaves `cycle_length` of them, read in parallel if `parallel`.
+    """
+
+    def __init__(self, f, cycle_length, block_length=1, parallel=True):
+        self.f = f
+        self.cycle_length = cycle_length
+        self.block_length = block_length
+        self.parallel = parallel
+
+    def __call__(self, x: Union[tf.data.Dataset]):
+        if isinstance(x, tf.data.Dataset):
+            return x.interleave(
+                self.f,
+                cycle_length=self.cycle_length,
+                block_length=self.block_length,
+                num_parallel_calls=AUTOTUNE if self.parallel else None)
+        raise TypeError("Unknown type {} of x.".format(type(x)))
+
+
+class Prefetch(Function):
+    def __init__(self, nb_buffer=AUTOTUNE):
+        self.nb_buffer = nb_buffer
+
+    def __call__(self, x: Union[tf.data.Dataset]):
+        if isinstance(x, tf.data.Dataset):
+            return x.prefetch(self.nb_buffer)
+        raise TypeError("Unknown type {} of x.".format(type(x)))
+
+
+class BucketByLength(Function):
+    """
+    Batch samples of similar length together, thus each batch is padded to
+    its own bucket instead of the longest sample of dataset.
+    """
+
+    def __init__(self,
+                 length,
+                 boundaries,
+                 batch_size,
+                 *,
+                 padded_shapes=None,
+                 padding_values=None,
+                 pad_to_bucket_boundary=True):
+        """
+        `length`: function of a sample, returns its length (int32 scalar).
+        `boundaries`: increasing lengths, buckets are [0, b_0), [b_0, b_1),
+        ..., samples are padded to `b_i - 1` if `pad_to_bucket_boundary`,
+        thus a fixed shape for each bucket, and all lengths must be less
+        than the last boundary.
+        `batch_size`: batch size of all buckets, or a list of
+        `len(boundaries) + 1` batch sizes of each bucket.
+        """
+        self.length = length
+        self.boundaries = list(boundaries)
+        if isinstance(batch_size, int):
+            batch_size = [batch_size] * (len(self.boundaries) + 1)
+        if len(batch_size) != len(self.boundaries) + 1:
+            raise ValueError(
+                "{} batch sizes for {} boundaries, expected {}.".format(
+                    len(batch_size), len(self.boundaries),
+                    len(self.boundaries) + 1))
+        self.batch_size = list(batch_size)
+        self.padded_shapes = padded_shapes
+        self.padding_values = padding_values
+        self.pad_to_bucket_boundary = pad_to_bucket_boundary
+
+    def __call__(self, x: Union[tf.data.Dataset]):
+        if isinstance(x, tf.data.Dataset):
+            return x.apply(
+                tf.data.experimental.bucket_by_sequence_length(
+                    self.length,
+                    self.boundaries,
+                    self.batch_size,
+                    padded_shapes=self.padded_shapes,
+                    padding_values=self.padding_values,
+                    pad_to_bucket_boundary=self.pad_to_bucket_boundary))
+        raise TypeError("Unknown type {} of x.".format(type(x)))
+
+
+def _source_fingerprint(source):
+    """
+    JSON compatible identity of `source`, a path, list of paths or columns,
+    which changes when any file of it is modified.
+    """
+    from .filtered import source_key
+    if source is None:
+        return None
+    if isinstance(source, (list, tuple)):
+        return [_source_fingerprint(s) for s in source]
+    if isinstance(source, (str, Path)):
+        stat = os.stat(str(source))
+        return [os.path.abspath(str(source)), stat.st_mtime_ns, stat.st_size]
+    _, key = source_key(source)
+    if key is None:
+        raise TypeError("Can not fingerprint source {}.".format(
+            type(source)))
+    return key
+
+
+def _source_identity(source):
+    """
+    `_source_fingerprint` of `source` without mtime and size of files, which
+    is kept when files of it are modified.
+    """
+    if isinstance(source, (list, tuple)):
+        return [_source_identity(s) for s in source]
+    key = _source_fingerprint(source)
+    if key is None:
+        return None
+    # fingerprints start with [path, mtime, size] of the source file
+    return [key[0]] + key[3:]
+
+
+class Cache(Function):
+    """
+    Persistent cache of processed samples in `cache_dir`.
+
+    First full pass over dataset writes samples to cache files (by
+    `tf.data.Dataset.cache`), later passes and later runs read from them.
+    Cache files are named by hash of `source` fingerprint (path, mtime and size
+    of files) and `config` (description of processing chain), thus a modified
+    source or config uses new files. Source of each cache is recorded in a
+    sidecar `<cache file>.source.json`, stale files of the same `name` are
+    removed only if they are of the same source (e.g. not of another partition
+    of the same file) and not being written (no lock file).
+
+    ```Python
+    f = (Map(normalize) >> Cache('/tmp/cache', 'sinogram', source=columns,
+                                 config={'normalize': 1e6})
+         >> Repeat() >> Shuffle(128) >> Batch(32))
+    ```
+    """
+    SUFFIX = '.cache'
+    SOURCE_SUFFIX = '.source.json'
+    LOCK_SUFFIX = '.lockfile'
+
+    def __init__(self, cache_dir, name='dataset', *, source=None, config=None):
+        self.cache_dir = str(cache_dir)
+        self.name = re.sub(r'[^\w.-]', '_', str(name))
+        self.source = source
+        self.config = config
+
+    def key(self):
+        return [_source_fingerprint(self.source), self.config]
+
+    def digest(self):
+        content = json.dumps(self.key(), sort_keys=True, default=repr)
+        return hashlib.sha1(content.encode()).hexdigest()[:16]
+
+    def path(self):
+        return os.path.join(self.cache_dir, '{}.{}{}'.format(
+            self.name, self.digest(), self.SUFFIX))
+
+    def _write_source(self, path):
+        with open(path + self.SOURCE_SUFFIX, 'w') as fout:
+            json.dump({'source': _source_identity(self.source)}, fout,
+                      default=repr)
+
+    def _is_same_source(self, path):
+        try:
+            with open(path + self.SOURCE_SUFFIX) as fin:
+                recorded = json.load(fin)['source']
+        except (OSError, ValueError, KeyError):
+            return False
+        current = json.loads(
+            json.dumps(_source_identity(self.source), default=repr))
+        return recorded == current
+
+    def _remove_stale(self, path):
+        pattern = re.compile(r'({}\.[0-9a-f]{{16}}{})'.format(
+            re.escape(self.name), re.escape(self.SUFFIX)))
+        current = os.path.basename(path)
+        files = {}
+        for f in os.listdir(self.cache_dir):
+            m = pattern.match(f)
+            if m is not None and m.group(1) != current:
+                files.setdefault(m.group(1), []).append(f)
+        for stale, fs in files.items():
+            stale_path = os.path.join(self.cache_dir, stale)
+            if (stale + self.LOCK_SUFFIX in fs
+                    or not self._is_same_source(stale_path)):
+                continue
+            for f in fs:
+                logger.info("Remove stale cache {}.".format(f))
+                os.remove(os.path.join(self.cache_dir, f))
+
+    def __call__(self, x: Union[tf.data.Dataset]):
+        if isinstance(x, tf.data.Dataset):
+            os.makedirs(self.cache_dir, exist_ok=True)
+            path = self.path()
+            self._remove_stale(path)
+            self._write_source(path)
+            logger.info("Dataset cached in {}.".format(path))
+            return x.cache(path)
+        raise TypeError("Unknown type {} of x.".format(type(x)))
+
+
 class ReshapeForBatch(Function):
     def __init__(self, batch_size, axis=0):
         self.batch_size = batch_size
@@ -138,6 +571,8 @@ class ReshapeForBatch(Function):
 
     def __call__(self, x: Union[tf.data.Dataset]):
         shape = shape_list(x)
+        if _is_batch_static(shape, self.axis):
+            return x
         shape[self.axis] = self.batch_size
         shape = [s if s is not None else -1 for s in shape]
         if isinstance(x, tf.Tensor):
@@ -146,10 +581,30 @@ class ReshapeForBatch(Function):
 
 
 class StandardProcessing(Function):
-    def __init__(self, batch_size, nb_epochs, is_shuffle):
-        self.f = (Repeat(nb_epochs)
+    def __init__(self,
+                 batch_size,
+                 nb_epochs,
+                 is_shuffle,
+                 *,
+                 processing=None,
+                 num_parallel_calls=AUTOTUNE,
+                 cache=None,
+                 nb_prefetch=AUTOTUNE):
+        """
+        `processing`: optional per sample function, applied by `Map` with
+        `num_parallel_calls`.
+        `cache`: optional `Cache` of processed samples, thus `processing` is
+        computed only in the first epoch of the first run.
+        `nb_prefetch`: number of batches prefetched, None for no prefetch.
+        """
+        self.f = (MapIf(lambda _: processing is not None,
+                        Map(processing, num_parallel_calls))
+                  >> MapIf(lambda _: cache is not None, cache)
+                  >> Repeat(nb_epochs)
                   >> MapIf(lambda _: is_shuffle, Shuffle(batch_size * 4))
-                  >> Batch(batch_size))
+                  >> Batch(batch_size)
+                  >> MapIf(lambda _: nb_prefetch is not None,
+                           Prefetch(nb_prefetch)))
 
     def __call__(self, x: Union[tf.data.Dataset]):
         if isinstance(x, tf.data.Dataset):
@@ -173,11 +628,36 @@ class TupleToDictForDataclass(Function):
 
 
 class ColumnsToTensorFlowDataset(Function):
-    def __init__(self, is_with_shape=False):
+    def __init__(self, is_with_shape=False, memory_budget=None):
+        """
+        `memory_budget`: if not None, columns with shapes and total size not
+        larger than it are read once and sliced by `from_tensor_slices`.
+        """
         self.is_with_shape = is_with_shape
+        self.memory_budget = memory_budget
+
+    def _fits_in_memory(self, columns, d2t):
+        if self.memory_budget is None or not self.is_with_shape:
+            return False
+        nb_bytes = _estimate_nb_bytes(
+            dict(enumerate(d2t(columns.dtypes))),
+            dict(enumerate(d2t(columns.dataclass.shapes()))),
+            columns.capacity)
+        return nb_bytes is not None and nb_bytes <= self.memory_budget
 
     def __call__(self, columns):
         d2t = DictToTupleForDataclass(columns.dataclass)
+        if self._fits_in_memory(columns, d2t):
+            logger.info("Columns {} uses {} pipeline.".format(
+                type(columns).__name__, PIPELINE.TENSOR_SLICES))
+            samples = [d2t(s) for s in columns]
+            return tf.data.Dataset.from_tensor_slices(
+                tuple(
+                    np.asarray([s[i] for s in samples],
+                               tf.as_dtype(t).as_numpy_dtype)
+                    for i, t in enumerate(d2t(columns.dtypes))))
+        logger.info("Columns {} uses {} pipeline.".format(
+            type(columns).__name__, PIPELINE.GENERATOR))
         if self.is_with_shape:
             return tf.data.Dataset.from_generator(
                 columns.__iter__,
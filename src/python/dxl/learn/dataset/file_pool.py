@@ -0,0 +1,208 @@
+"""
+Process wide pool of read-only HDF5 / PyTables file handles.
+
+Opening the same file by many columns at the same time shares one handle:
+`FileHandlePool.open` returns a `FileLease`, handles are reference counted by
+leases, and a handle is closed when its last lease is released, thus the file
+could be written again in the same process.
+
+With `keep_alive=True`, released handles are kept open for reuse (e.g. shards
+opened again and again), and least recently used idle ones are closed when
+more than `max_open` handles are open. Handles in use are never closed by the
+pool. An idle handle of a file changed on disk is reopened, files to be
+written in the same process should be closed by `FileHandlePool.clear` first.
+
+Handles are not shared with forked processes, `FileLease.file` reopens the
+file in a child process (e.g. workers of `ParallelColumnsIterator`) on its
+first access.
+
+Files are always opened read-only, HDF5 files optionally in SWMR read mode,
+thus reading files being appended by another process.
+
+```Python
+lease = default_pool().open('phantoms.h5')
+x = lease.file['x'][:128]
+lease.close()
+>>> default_pool().stats()
+{'nb_open': 0, 'nb_in_use': 0, 'nb_opened': 1, 'nb_reused': 0}
+```
+"""
+import atexit
+import os
+import threading
+from collections import OrderedDict
+
+import h5py
+import tables as tb
+
+from dxl.learn.utils.logger import logger
+
+DEFAULT_MAX_OPEN = 64
+
+
+class BACKEND:
+    H5PY = 'h5py'
+    TABLES = 'tables'
+
+
+def _open_file(path, backend, swmr):
+    if backend == BACKEND.H5PY:
+        return h5py.File(path, 'r', swmr=swmr)
+    if backend == BACKEND.TABLES:
+        return tb.open_file(path, mode='r')
+    raise ValueError("Unknown backend {}.".format(backend))
+
+
+def _file_stat(path):
+    stat = os.stat(path)
+    return stat.st_ino, stat.st_size, stat.st_mtime_ns
+
+
+class FileHandlePool:
+    def __init__(self, max_open=DEFAULT_MAX_OPEN, keep_alive=False):
+        """
+        `keep_alive`: if True, released handles are kept open for reuse, at
+        most `max_open` handles are open unless they are in use.
+        """
+        self.max_open = max(1, max_open)
+        self.keep_alive = keep_alive
+        self._handles = OrderedDict()
+        self._stats = {}
+        self._nb_leases = {}
+        self._pid = os.getpid()
+        self._lock = threading.RLock()
+        self.nb_opened = 0
+        self.nb_reused = 0
+
+    def _check_fork(self):
+        """
+        Forget handles (and lock) inherited from parent process, without
+        closing them. Called before taking the lock.
+        """
+        if self._pid != os.getpid():
+            self._lock = threading.RLock()
+            self._handles = OrderedDict()
+            self._stats = {}
+            self._nb_leases = {}
+            self._pid = os.getpid()
+
+    def acquire(self, path, backend=BACKEND.H5PY, swmr=False):
+        """
+        Returns (key, file handle) of `path`, the caller should `release` key.
+        """
+        key = (backend, os.path.realpath(str(path)), bool(swmr))
+        self._check_fork()
+        with self._lock:
+            stat = _file_stat(key[1])
+            if (key in self._handles and key not in self._nb_leases
+                    and self._stats[key] != stat):
+                self._close(key)
+            if key in self._handles:
+                self._handles.move_to_end(key)
+                self.nb_reused += 1
+            else:
+                self._handles[key] = _open_file(str(path), backend, swmr)
+                self._stats[key] = stat
+                self.nb_opened += 1
+            self._nb_leases[key] = self._nb_leases.get(key, 0) + 1
+            handle = self._handles[key]
+            self._close_idle()
+            return key, handle
+
+    def release(self, key):
+        self._check_fork()
+        with self._lock:
+            if key not in self._nb_leases:
+                return
+            self._nb_leases[key] -= 1
+            if self._nb_leases[key] == 0:
+                del self._nb_leases[key]
+                if not self.keep_alive:
+                    self._close(key)
+            self._close_idle()
+
+    def _close(self, key):
+        del self._stats[key]
+        self._handles.pop(key).close()
+
+    def _close_idle(self):
+        idle = [k for k in self._handles if k not in self._nb_leases]
+        nb_to_close = len(self._handles) - self.max_open
+        for k in idle[:max(0, nb_to_close)]:
+            self._close(k)
+        if len(self._handles) > self.max_open:
+            logger.info("{} files in use, more than max_open {}.".format(
+                len(self._handles), self.max_open))
+
+    def open(self, path, backend=BACKEND.H5PY, swmr=False):
+        return FileLease(self, path, backend, swmr)
+
+    def clear(self):
+        """
+        Close all idle handles.
+        """
+        self._check_fork()
+        with self._lock:
+            for k in [k for k in self._handles if k not in self._nb_leases]:
+                self._close(k)
+
+    def stats(self):
+        self._check_fork()
+        with self._lock:
+            return {
+                'nb_open': len(self._handles),
+                'nb_in_use': len(self._nb_leases),
+                'nb_opened': self.nb_opened,
+                'nb_reused': self.nb_reused,
+            }
+
+
+class FileLease:
+    """
+    A reference to a pooled file handle, reacquired after fork.
+    """
+
+    def __init__(self, pool, path, backend=BACKEND.H5PY, swmr=False):
+        self.pool = pool
+        self.path = str(path)
+        self.backend = backend
+        self.swmr = swmr
+        self._key, self._file = pool.acquire(path, backend, swmr)
+        self._pid = os.getpid()
+
+    @property
+    def file(self):
+        if self._file is None:
+            raise ValueError("File {} is closed.".format(self.path))
+        if self._pid != os.getpid():
+            self._key, self._file = self.pool.acquire(self.path, self.backend,
+                                                      self.swmr)
+            self._pid = os.getpid()
+        return self._file
+
+    @property
+    def filename(self):
+        return self.path
+
+    def close(self):
+        if self._file is not None:
+            if self._pid == os.getpid():
+                self.pool.release(self._key)
+            self._file = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, type, value, tb):
+        self.close()
+
+
+_default_pool = None
+
+
+def default_pool():
+    global _default_pool
+    if _default_pool is None:
+        _default_pool = FileHandlePool()
+        atexit.register(_default_pool.clear)
+    return _default_pool
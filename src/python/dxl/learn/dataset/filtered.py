@@ -0,0 +1,162 @@
+"""
+Filtered view of DataColumns by a predicate expression.
+
+The predicate is evaluated where data lives: by `Table.get_where_list` for
+`PyTablesColumns` (in-kernel query), otherwise by a vectorized numexpr mask
+over blocks of only the columns used in expression. Resulted index array is
+persisted, keyed by expression, its variables and the source file (path,
+mtime and size), thus later runs skip the scan.
+
+```Python
+photons = PyTablesColumns('gamma_photon_5.h5', '/photons', ['hits', 'nb_true_hits'])
+two_hits = FilteredColumns(photons, 'nb_true_hits == nb_hits', condvars={'nb_hits': 2})
+```
+"""
+import hashlib
+import json
+import os
+
+import numexpr
+import numpy as np
+
+from .data_column import (DataColumnsPartition, DataColumnsWithGetItem,
+                          HDF5DataColumns, NDArrayColumns, PyTablesColumns,
+                          _as_indices)
+
+DEFAULT_BLOCK_SIZE = 65536
+
+
+def _file_key(path):
+    stat = os.stat(str(path))
+    return [os.path.abspath(str(path)), stat.st_mtime_ns, stat.st_size]
+
+
+def source_key(columns):
+    """
+    Returns (path of source file, key identifying its content) of `columns`,
+    or (None, None) if it is not backed by a file.
+    """
+    if isinstance(columns, PyTablesColumns):
+        path = columns._file.filename
+        return path, _file_key(path) + [columns._node._v_pathname]
+    if isinstance(columns, HDF5DataColumns):
+        path = columns.data.filename
+        return path, _file_key(path)
+    if isinstance(columns, FilteredColumns):
+        return columns.source_path, columns.key
+    if isinstance(columns, DataColumnsPartition):
+        path, key = source_key(columns.data)
+        if key is None:
+            return None, None
+        return path, key + [columns.partitioner.key()]
+    return None, None
+
+
+class FilteredColumns(DataColumnsWithGetItem):
+    def __init__(self,
+                 source,
+                 expression,
+                 *,
+                 condvars=None,
+                 cache_dir=None,
+                 block_size=DEFAULT_BLOCK_SIZE):
+        """
+        Args:
+            source: DataColumns to be filtered.
+            expression: numexpr/PyTables condition string over column names of
+                `source` and `condvars`, evaluates to one bool per sample.
+            condvars: dict of extra variables used in expression.
+            cache_dir: directory to persist index, default to directory of
+                source file. Index is not persisted if neither is available.
+        """
+        self._expression = expression
+        self._condvars = dict(condvars or {})
+        self._block_size = block_size
+        self.source_path, self.key = self._make_key(source)
+        self.index_path = self._make_index_path(cache_dir)
+        super().__init__(source)
+        self._indices = self._load_or_evaluate()
+
+    def _make_key(self, source):
+        path, key = source_key(source)
+        if key is None:
+            return None, None
+        condvars = {k: np.asarray(v).tolist() for k, v in self._condvars.items()}
+        return path, [key, self._expression, sorted(condvars.items())]
+
+    def _make_index_path(self, cache_dir):
+        if self.key is None:
+            return None
+        if cache_dir is None:
+            cache_dir = os.path.dirname(os.path.abspath(self.source_path))
+        digest = hashlib.sha1(
+            json.dumps(self.key).encode()).hexdigest()
+        return os.path.join(
+            str(cache_dir), '{}.{}.index.npy'.format(
+                os.path.basename(self.source_path), digest[:16]))
+
+    def _load_or_evaluate(self):
+        if self.index_path is not None and os.path.exists(self.index_path):
+            return np.load(self.index_path)
+        indices = self._evaluate()
+        if self.index_path is not None:
+            try:
+                path_tmp = '{}.{}.tmp.npy'.format(self.index_path, os.getpid())
+                np.save(path_tmp, indices)
+                os.replace(path_tmp, self.index_path)
+            except OSError:
+                pass
+        return indices
+
+    def _evaluate(self):
+        if isinstance(self.data, PyTablesColumns):
+            return self.data._node.get_where_list(
+                self._expression, condvars=self._condvars,
+                sort=True).astype(np.int64)
+        names = compile(self._expression, '<filter>', 'eval').co_names
+        names = [n for n in names if n in self.data.columns]
+        capacity = self.data.capacity
+        result = []
+        for start in range(0, capacity, self._block_size):
+            stop = min(start + self._block_size, capacity)
+            local_dict = dict(self._condvars)
+            local_dict.update(self._read_block(names, start, stop))
+            mask = numexpr.evaluate(self._expression, local_dict=local_dict)
+            result.append(np.flatnonzero(mask) + start)
+        if len(result) == 0:
+            return np.zeros([0], np.int64)
+        return np.concatenate(result).astype(np.int64)
+
+    def _read_block(self, names, start, stop):
+        if isinstance(self.data, NDArrayColumns):
+            return {k: np.asarray(self.data.data[k][start:stop]) for k in names}
+        batch = self.data.get_batch(slice(start, stop))
+        return {k: np.asarray(batch[k]) for k in names}
+
+    @property
+    def indices(self):
+        return self._indices
+
+    def _calculate_capacity(self):
+        return self._indices.size
+
+    @property
+    def columns(self):
+        return self.data.columns
+
+    @property
+    def types(self):
+        return self.data.types
+
+    @property
+    def shapes(self):
+        return self.data.shapes
+
+    def __getitem__(self, i):
+        if isinstance(i, slice):
+            return self.get_batch(i)
+        return self.data[int(self._indices[i])]
+
+    def get_batch(self, indices):
+        return self.data.get_batch(
+            self._indices[_as_indices(indices, self.capacity)])
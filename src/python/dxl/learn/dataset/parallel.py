@@ -0,0 +1,335 @@
+"""
+Multiprocess reading of DataColumns.
+
+Decoding and processing of samples in `DataColumnsWithGetItem` runs in Python,
+thus in one thread under GIL when used by `tf.data.Dataset.from_generator`.
+`ParallelColumnsIterator` reads blocks of samples in a pool of worker
+processes, each of them constructs its own columns (thus its own h5py/PyTables
+handles) by a picklable `columns_factory`, e.g.
+
+```Python
+factory = functools.partial(HDF5DataColumns, 'phantoms.h5')
+for batch in ParallelColumnsIterator(factory, 10000, block_size=128):
+    ...
+```
+
+Results are written into shared memory slots and returned as arrays viewing
+these slots instead of being pickled, a slot is reused once the next block is
+requested, thus yielded arrays are only valid until then (use `copy=True`
+to keep them). Number of in flight blocks (thus slots) is bounded by
+`max_in_flight`.
+
+Workers are started by 'forkserver' (or 'spawn' if it is not available) by
+default, since forking a process in which TensorFlow is initialized may
+deadlock.
+"""
+import multiprocessing as mp
+import os
+import queue
+import traceback
+from multiprocessing import shared_memory
+
+import numpy as np
+
+from .data_column import DataColumns
+
+_ALIGNMENT = 64
+
+
+def default_mp_context():
+    methods = mp.get_all_start_methods()
+    return mp.get_context(
+        'forkserver' if 'forkserver' in methods else 'spawn')
+
+
+def _align(offset):
+    return (offset + _ALIGNMENT - 1) // _ALIGNMENT * _ALIGNMENT
+
+
+def _nb_bytes(batch):
+    if not isinstance(batch, dict):
+        batch = {None: batch}
+    return sum(_align(np.asarray(v).nbytes) for v in batch.values())
+
+
+def _write_to_slot(shm, batch):
+    """
+    Returns layout of `batch` in `shm`, or None if `batch` does not fit.
+    """
+    is_dict = isinstance(batch, dict)
+    if not is_dict:
+        batch = {None: batch}
+    if _nb_bytes(batch) > shm.size:
+        return None
+    layout, offset = {}, 0
+    for k, v in batch.items():
+        v = np.ascontiguousarray(v)
+        target = np.ndarray(v.shape, v.dtype, buffer=shm.buf, offset=offset)
+        target[...] = v
+        layout[k] = (offset, v.dtype.str, v.shape)
+        offset = _align(offset + v.nbytes)
+    return is_dict, layout
+
+
+def _read_from_slot(shm, layout, copy):
+    is_dict, layout = layout
+    result = {}
+    for k, (offset, dtype, shape) in layout.items():
+        v = np.ndarray(shape, np.dtype(dtype), buffer=shm.buf, offset=offset)
+        result[k] = v.copy() if copy else v
+    return result if is_dict else result[None]
+
+
+def _attach(name):
+    shm = shared_memory.SharedMemory(name=name)
+    try:
+        # Slots are owned by the parent process, avoid worker's resource
+        # tracker unlinking them on worker exit.
+        from multiprocessing import resource_tracker
+        resource_tracker.unregister(shm._name, 'shared_memory')
+    except Exception:
+        pass
+    return shm
+
+
+def _worker_loop(columns_factory, requests, results):
+    try:
+        columns, error = columns_factory(), None
+    except Exception:
+        columns, error = None, traceback.format_exc()
+    slots = {}
+    try:
+        while True:
+            request = requests.get()
+            if request is None:
+                break
+            seq, slot, name, indices = request
+            if error is not None:
+                results.put((seq, slot, None, None, error))
+                continue
+            try:
+                batch = columns.get_batch(indices)
+                if name not in slots:
+                    slots[name] = _attach(name)
+                layout = _write_to_slot(slots[name], batch)
+                if layout is None:
+                    results.put((seq, slot, None, batch, None))
+                else:
+                    results.put((seq, slot, layout, None, None))
+            except Exception:
+                results.put((seq, slot, None, None, traceback.format_exc()))
+    finally:
+        for shm in slots.values():
+            shm.close()
+        if columns is not None and hasattr(columns, 'close'):
+            columns.close()
+
+
+class ParallelColumnsIterator:
+    """
+    Iterator of batched blocks of `columns_factory()`, read by `nb_workers`
+    processes.
+
+    Args:
+        columns_factory: picklable callable returns a `DataColumns` supports
+            `get_batch`, called once in each worker.
+        indices: int (capacity, thus all samples) or sequence of sample indices.
+        block_size: number of samples of each yielded block.
+        nb_workers: number of worker processes, default `os.cpu_count()`.
+        max_in_flight: maximum number of requested but not consumed blocks,
+            default `2 * nb_workers`.
+        is_ordered: yield blocks in order of `indices` if True, otherwise in
+            order of completion.
+        slot_bytes: size of each shared memory slot, default estimated from
+            the first sample. Blocks larger than slot are pickled instead.
+        copy: copy arrays out of shared memory slots before yielding.
+        mp_context: multiprocessing context of workers, default to
+            `default_mp_context()`.
+    """
+
+    def __init__(self,
+                 columns_factory,
+                 indices,
+                 block_size=256,
+                 *,
+                 nb_workers=None,
+                 max_in_flight=None,
+                 is_ordered=True,
+                 slot_bytes=None,
+                 copy=False,
+                 mp_context=None):
+        if isinstance(indices, int):
+            indices = np.arange(indices)
+        self._factory = columns_factory
+        self._indices = np.asarray(indices, dtype=np.int64)
+        self._block_size = block_size
+        self._nb_workers = nb_workers or os.cpu_count() or 1
+        self._max_in_flight = max_in_flight or 2 * self._nb_workers
+        self._is_ordered = is_ordered
+        self._slot_bytes = slot_bytes
+        self._copy = copy
+        self._context = mp_context or default_mp_context()
+
+    def _blocks(self):
+        for start in range(0, self._indices.size, self._block_size):
+            yield self._indices[start:start + self._block_size]
+
+    @property
+    def nb_blocks(self):
+        return -(-self._indices.size // self._block_size)
+
+    def _estimate_slot_bytes(self):
+        if self._slot_bytes is not None:
+            return self._slot_bytes
+        columns = self._factory()
+        try:
+            sample = columns.get_batch(self._indices[:1])
+        finally:
+            if hasattr(columns, 'close'):
+                columns.close()
+        return _nb_bytes(sample) * self._block_size + _ALIGNMENT
+
+    def __iter__(self):
+        if self._indices.size == 0:
+            return iter(())
+        return self._iterate()
+
+    def _iterate(self):
+        slot_bytes = self._estimate_slot_bytes()
+        nb_slots = min(self._max_in_flight, self.nb_blocks)
+        slots = [
+            shared_memory.SharedMemory(create=True, size=slot_bytes)
+            for _ in range(nb_slots)
+        ]
+        requests, results = self._context.Queue(), self._context.Queue()
+        workers = [
+            self._context.Process(
+                target=_worker_loop,
+                args=(self._factory, requests, results),
+                daemon=True) for _ in range(self._nb_workers)
+        ]
+        for w in workers:
+            w.start()
+        blocks = enumerate(self._blocks())
+        free_slots = list(range(nb_slots))
+
+        def submit():
+            while free_slots:
+                seq_block = next(blocks, None)
+                if seq_block is None:
+                    return
+                slot = free_slots.pop()
+                seq, block = seq_block
+                requests.put((seq, slot, slots[slot].name, block))
+
+        try:
+            submit()
+            ready, nb_yielded = {}, 0
+            while nb_yielded < self.nb_blocks:
+                try:
+                    seq, slot, layout, batch, error = results.get(timeout=1.0)
+                except queue.Empty:
+                    if not all(w.is_alive() for w in workers):
+                        raise RuntimeError("Worker process exited unexpectedly.")
+                    continue
+                if error is not None:
+                    raise RuntimeError(
+                        "Reading block {} failed in worker:\n{}".format(
+                            seq, error))
+                if layout is not None:
+                    batch = _read_from_slot(slots[slot], layout, self._copy)
+                ready[seq] = (slot, batch)
+                while ready:
+                    if self._is_ordered:
+                        if nb_yielded not in ready:
+                            break
+                        slot, batch = ready.pop(nb_yielded)
+                    else:
+                        _, (slot, batch) = ready.popitem()
+                    yield batch
+                    batch = None
+                    nb_yielded += 1
+                    free_slots.append(slot)
+                    submit()
+        finally:
+            for _ in workers:
+                requests.put(None)
+            for w in workers:
+                w.join(timeout=1.0)
+                if w.is_alive():
+                    w.terminate()
+            for shm in slots:
+                try:
+                    shm.close()
+                except BufferError:
+                    pass
+                shm.unlink()
+
+
+class ParallelColumns(DataColumns):
+    """
+    DataColumns reading by `ParallelColumnsIterator`, thus could be used by
+    `DatasetFromColumns(..., read_batch_size=...)` directly. Blocks are always
+    copied out of shared memory slots, since `tf.data` may keep (prefetch)
+    arrays without copying them while slots are reused.
+
+    Metadata (capacity, types, shapes) is read from a local instance created by
+    `columns_factory` in this process.
+    """
+
+    def __init__(self, columns_factory, *, block_size=256, **parallel_kwargs):
+        self._block_size = block_size
+        self._parallel_kwargs = parallel_kwargs
+        super().__init__(columns_factory)
+
+    def _process(self, data):
+        self._local = data()
+        return data
+
+    def _calculate_capacity(self):
+        return self._local.capacity
+
+    @property
+    def columns(self):
+        return self._local.columns
+
+    @property
+    def shapes(self):
+        return self._local.shapes
+
+    @property
+    def types(self):
+        return self._local.types
+
+    def iter_batches(self, batch_size=None, drop_remainder=False):
+        batch_size = batch_size or self._block_size
+        kwargs = dict(self._parallel_kwargs, copy=True)
+        it = ParallelColumnsIterator(self.data, self.capacity, batch_size,
+                                     **kwargs)
+
+        def batches():
+            for b in it:
+                nb_samples = len(next(iter(b.values()))
+                                 if isinstance(b, dict) else b)
+                if drop_remainder and nb_samples < batch_size:
+                    return
+                yield b
+
+        return batches()
+
+    def _make_iterator(self):
+        def it():
+            for b in self.iter_batches():
+                if isinstance(b, dict):
+                    keys = tuple(b.keys())
+                    for i in range(len(b[keys[0]])):
+                        yield {k: b[k][i] for k in keys}
+                else:
+                    for v in b:
+                        yield v
+
+        return it()
+
+    def close(self):
+        if hasattr(self._local, 'close'):
+            self._local.close()
@@ -65,31 +65,141 @@ next(p['train']) # 1
 next(p['test']) # 1000
 ```
 """
+import hashlib
+import json
 from collections import UserDict
 from typing import Dict, Iterable
 
 import numpy as np
-from .data_column import DataColumns, DataColumnsWithGetItem
+from .data_column import DataColumns, DataColumnsWithGetItem, _stack_samples
+from .permutation import FeistelPermutation, PermutedIndices, permutation_seed
+from .sampling import AliasTable, inverse_frequency_weights
+
+DEFAULT_BLOCK_SIZE = 1024
+
+
+def _spec_key(spec):
+    """
+    Deterministic key of a column spec: a column name, a callable (by its
+    qualified name) or an array like (by hash of its content).
+    """
+    if spec is None or isinstance(spec, (str, int, float)):
+        return spec
+    if callable(spec):
+        return '{}.{}'.format(
+            getattr(spec, '__module__', None),
+            getattr(spec, '__qualname__', type(spec).__qualname__))
+    value = np.ascontiguousarray(spec)
+    return [str(value.dtype), list(value.shape),
+            hashlib.sha1(value.tobytes()).hexdigest()]
+
+
+def _columns_key(data_column):
+    """
+    Key of `data_column` in caches of partitioners: key of its source file if
+    it is backed by one (see `filtered.source_key`), otherwise the object
+    itself, which is compared by identity and kept alive by the cache, thus
+    never confused with a new object reusing its id.
+    """
+    from .filtered import source_key
+    _, key = source_key(data_column)
+    if key is None:
+        return data_column
+    return json.dumps(key, default=str)
 
 
 class Partitioner:
+    # whether indices change between epochs, thus could not be read only once
+    is_epoch_dependent = False
+
+    def key(self):
+        """
+        Deterministic JSON compatible identity of configuration, i.e. class
+        name and configuration values, without runtime state (epoch, caches).
+        """
+        return [type(self).__name__]
+
     def _get_original_indices(self, data_column):
         return range(data_column.capacity)
 
     def _get_valid_indices(self, indicies):
         return indicies
 
+    def indices(self, data_column):
+        """
+        Valid indices of `data_column`, a `range` if they are contiguous,
+        otherwise a numpy int64 array.
+        """
+        return self._get_valid_indices(
+            self._get_original_indices(data_column))
+
+    def take(self, data_column, positions):
+        """
+        Indices at `positions` (int64 array) of valid indices of
+        `data_column`.
+        """
+        valid = self.indices(data_column)
+        if isinstance(valid, range):
+            return valid.start + positions * valid.step
+        return np.asarray(valid[positions])
+
     def partition(self, data_column: Iterable) -> Iterable:
         def valid_index_generator(data_column, indices):
             for i in indices:
-                yield data_column[i]
+                yield data_column[int(i)]
+
+        return valid_index_generator(data_column, self.indices(data_column))
 
-        return valid_index_generator(
-            data_column,
-            self._get_valid_indices(self._get_original_indices(data_column)))
+    def partition_batches(self, data_column, batch_size, drop_remainder=False):
+        """
+        Iterator of batches read by `data_column.get_batch` with blocks of
+        `batch_size` valid indices.
+        """
+        indices = self.indices(data_column)
+        if type(data_column).get_batch is DataColumns.get_batch:
+
+            def get_batch(block):
+                return _stack_samples([data_column[int(i)] for i in block])
+        else:
+            get_batch = data_column.get_batch
+
+        def it():
+            for start in range(0, len(indices), batch_size):
+                block = np.asarray(indices[start:start + batch_size])
+                if drop_remainder and len(block) < batch_size:
+                    return
+                yield get_batch(block)
+
+        return it()
 
     def get_capacity(self, data_columns):
-        raise NotImplementedError
+        return len(self.indices(data_columns))
+
+
+def _take_blocks(indices, blocks):
+    """
+    Select `blocks` [(start, stop)] of positions from `indices`, in order of
+    `blocks`. Consecutive adjacent blocks are merged, and result is a `range`
+    if it is contiguous and `indices` is a `range`, thus no index is
+    materialized.
+    """
+    merged = []
+    for start, stop in blocks:
+        if merged and merged[-1][1] == start:
+            merged[-1] = (merged[-1][0], stop)
+        else:
+            merged.append((start, stop))
+    if isinstance(indices, range):
+        if len(merged) == 0:
+            return range(0)
+        if len(merged) == 1:
+            return indices[merged[0][0]:merged[0][1]]
+    positions = np.concatenate(
+        [np.arange(start, stop, dtype=np.int64) for start, stop in merged] +
+        [np.zeros([0], np.int64)])
+    if isinstance(indices, range):
+        return indices.start + positions * indices.step
+    return np.asarray(indices, dtype=np.int64)[positions]
 
 
 class CrossValidatePartitioner(Partitioner):
@@ -100,20 +210,88 @@ class CrossValidatePartitioner(Partitioner):
             in_blocks = [in_blocks]
         self._in_blocks = in_blocks
 
+    def key(self):
+        return super().key() + [self._nb_blocks, list(self._in_blocks)]
+
     def _get_valid_indices(self, indices):
-        result = []
         len_block = len(indices) // self._nb_blocks
-        for b in self._in_blocks:
-            result += [
-                indices[i] for i in range(b * len_block, (b + 1) * len_block)
-            ]
-        return tuple(result)
+        return _take_blocks(indices, [(b * len_block, (b + 1) * len_block)
+                                      for b in self._in_blocks])
+
+    def take(self, data_column, positions):
+        # block arithmetic, valid indices are not materialized
+        len_block = data_column.capacity // self._nb_blocks
+        blocks = np.asarray(list(self._in_blocks), dtype=np.int64)
+        return blocks[positions // len_block] * len_block + positions % len_block
 
     def get_capacity(self, data_columns):
         len_block = data_columns.capacity // self._nb_blocks
         return len_block * len(self._in_blocks)
 
 
+def _column_values(data_column, spec):
+    """
+    Per sample values of `data_column` given by `spec`, a column name, a
+    callable of `data_column` or an array like.
+    """
+    if isinstance(spec, str):
+        return np.asarray(data_column.read_column(spec))
+    if callable(spec):
+        return np.asarray(spec(data_column))
+    return np.asarray(spec)
+
+
+class StratifiedCrossValidatePartitioner(Partitioner):
+    """
+    Cross validation folds keeping ratio of each class in `labels` (a column
+    name, callable of data columns or array of one label per sample).
+
+    Samples of each class are split into `nb_blocks` folds in their original
+    order, all folds are built in one vectorized pass.
+    """
+
+    def __init__(self, labels, nb_blocks, in_blocks):
+        super().__init__()
+        self._labels = labels
+        self._nb_blocks = nb_blocks
+        if isinstance(in_blocks, int):
+            in_blocks = [in_blocks]
+        self._in_blocks = np.asarray(list(in_blocks), dtype=np.int64)
+        self._cache = None
+
+    def key(self):
+        return super().key() + [
+            _spec_key(self._labels), self._nb_blocks,
+            self._in_blocks.tolist()
+        ]
+
+    def folds(self, data_column):
+        """
+        Fold of each sample of `data_column`.
+        """
+        labels = _column_values(data_column, self._labels).reshape(-1)
+        if labels.size != data_column.capacity:
+            raise ValueError("{} labels for {} samples.".format(
+                labels.size, data_column.capacity))
+        _, inverse, counts = np.unique(
+            labels, return_inverse=True, return_counts=True)
+        inverse = inverse.reshape(-1)
+        order = np.argsort(inverse, kind='stable')
+        starts = np.concatenate([[0], np.cumsum(counts)[:-1]])
+        rank = np.empty(labels.size, np.int64)
+        rank[order] = np.arange(labels.size) - starts[inverse[order]]
+        return rank * self._nb_blocks // counts[inverse]
+
+    def indices(self, data_column):
+        key = _columns_key(data_column)
+        if self._cache is not None and self._cache[0] == key:
+            return self._cache[1]
+        result = np.flatnonzero(
+            np.isin(self.folds(data_column), self._in_blocks)).astype(np.int64)
+        self._cache = (key, result)
+        return result
+
+
 class Train80Partitioner(CrossValidatePartitioner):
     def __init__(self, is_train):
         nb_blocks, nb_train = 10, 8
@@ -122,3 +300,264 @@ class Train80Partitioner(CrossValidatePartitioner):
         else:
             in_blocks = range(nb_train, nb_blocks)
         super().__init__(nb_blocks, in_blocks)
+
+
+class ShufflePartitioner(Partitioner):
+    """
+    Full shuffle of (valid indices of `partitioner`), different in each
+    epoch, without materializing permutation.
+
+    Order of epoch `e` is a `FeistelPermutation` seeded by `(seed, e)`, thus it
+    is reproducible and `index_at(k)` is O(1). `partition` and
+    `partition_batches` use current `epoch` then advance it, hence repeated
+    iterations (e.g. by `tf.data.Dataset.repeat`) get new orders.
+    """
+    is_epoch_dependent = True
+
+    def __init__(self, seed=0, partitioner=None, *, epoch=0, nb_rounds=4):
+        super().__init__()
+        self.seed = seed
+        self.epoch = epoch
+        self._partitioner = partitioner or Partitioner()
+        self._nb_rounds = nb_rounds
+
+    def key(self):
+        return super().key() + [
+            self.seed, self._nb_rounds,
+            self._partitioner.key()
+        ]
+
+    def set_epoch(self, epoch):
+        self.epoch = epoch
+
+    def indices(self, data_column, epoch=None):
+        base = self._partitioner.indices(data_column)
+        epoch = self.epoch if epoch is None else epoch
+        return PermutedIndices(
+            base,
+            FeistelPermutation(
+                len(base), permutation_seed(self.seed, epoch),
+                self._nb_rounds))
+
+    def index_at(self, data_column, k, epoch=None):
+        """
+        Index of `k`-th sample of `epoch` (default current one).
+        """
+        return self.indices(data_column, epoch)[k]
+
+    def partition(self, data_column):
+        result = super().partition(data_column)
+        self.epoch += 1
+        return result
+
+    def partition_batches(self, data_column, batch_size, drop_remainder=False):
+        result = super().partition_batches(data_column, batch_size,
+                                           drop_remainder)
+        self.epoch += 1
+        return result
+
+    def get_capacity(self, data_columns):
+        return self._partitioner.get_capacity(data_columns)
+
+
+class BlockShufflePartitioner(ShufflePartitioner):
+    """
+    Locality aware shuffle of (valid indices of `partitioner`).
+
+    Indices are grouped into blocks of `block_size` (default `block_size` of
+    data columns, i.e. chunk size of HDF5 dataset or PyTables table), order of
+    blocks is shuffled, then samples are shuffled inside each window of
+    `window` consecutive blocks. Thus only `window` chunks are in use at the
+    same time (which fits in a `ChunkCache`) and each chunk is decoded once per
+    epoch, while mixing is close to global for large datasets.
+    """
+
+    def __init__(self,
+                 seed=0,
+                 partitioner=None,
+                 *,
+                 block_size=None,
+                 window=16,
+                 epoch=0):
+        super().__init__(seed, partitioner, epoch=epoch)
+        self._block_size = block_size
+        self._window = window
+        self._cache = None
+
+    def key(self):
+        return super().key() + [self._block_size, self._window]
+
+    def get_block_size(self, data_column):
+        return (self._block_size or data_column.block_size
+                or DEFAULT_BLOCK_SIZE)
+
+    def indices(self, data_column, epoch=None):
+        epoch = self.epoch if epoch is None else epoch
+        key = (_columns_key(data_column), self.seed, epoch)
+        if self._cache is not None and self._cache[0] == key:
+            return self._cache[1]
+        base = np.asarray(self._partitioner.indices(data_column), np.int64)
+        rng = np.random.RandomState(
+            permutation_seed(self.seed, epoch) % 2**32)
+        if base.size == 0:
+            return base
+        blocks = base // self.get_block_size(data_column)
+        segments = np.cumsum(np.concatenate([[0], blocks[1:] != blocks[:-1]]))
+        rank = np.empty(segments[-1] + 1, np.int64)
+        rank[rng.permutation(rank.size)] = np.arange(rank.size)
+        rank = rank[segments]
+        order = np.lexsort((rng.random_sample(base.size), rank // self._window))
+        result = base[order]
+        self._cache = (key, result)
+        return result
+
+
+class WorkerShardPartitioner(ShufflePartitioner):
+    """
+    Disjoint shard of (valid indices of `partitioner`) for this worker of a
+    `MasterWorkerCluster`.
+
+    All workers shuffle with the same `seed` and epoch, worker `t` of `n` takes
+    positions `t, t + n, t + 2n, ...` of the shuffled order, thus shards are
+    disjoint and reshuffled in each epoch. Shards have equal sizes, so no worker
+    waits for others at the end of an epoch: with `remainder='pad'` shards are
+    padded by wrapping around to the start of the shuffled order, with
+    `remainder='drop'` the last `capacity % n` samples of each epoch are
+    skipped.
+
+    `nb_workers` and `task_index` default to `DefaultCluster` and `ThisHost`.
+    """
+    REMAINDERS = ('pad', 'drop')
+
+    def __init__(self,
+                 seed=0,
+                 partitioner=None,
+                 *,
+                 nb_workers=None,
+                 task_index=None,
+                 remainder='pad',
+                 epoch=0):
+        super().__init__(seed, partitioner, epoch=epoch)
+        if remainder not in self.REMAINDERS:
+            raise ValueError("Invalid remainder {}, expected one of {}.".format(
+                remainder, self.REMAINDERS))
+        self._nb_workers = nb_workers
+        self._task_index = task_index
+        self._remainder = remainder
+        self._cache = None
+
+    def key(self):
+        return super().key() + list(self.worker()) + [self._remainder]
+
+    def worker(self):
+        """
+        Returns (nb_workers, task_index) of this host.
+        """
+        if self._nb_workers is not None and self._task_index is not None:
+            return self._nb_workers, self._task_index
+        from ..distribute import DefaultCluster, ThisHost, JOB_NAME
+        cluster, host = DefaultCluster.cluster(), ThisHost.host()
+        if cluster is None or host is None:
+            return 1, 0
+        if host.job != JOB_NAME.WORKER:
+            raise ValueError("Host {} is not a worker.".format(host))
+        return cluster.nb_workers, host.task_index
+
+    def _shard_size(self, nb_samples, nb_workers):
+        if self._remainder == 'pad':
+            return -(-nb_samples // nb_workers)
+        return nb_samples // nb_workers
+
+    def indices(self, data_column, epoch=None):
+        epoch = self.epoch if epoch is None else epoch
+        key = (_columns_key(data_column), self.seed, epoch)
+        if self._cache is not None and self._cache[0] == key:
+            return self._cache[1]
+        nb_workers, task_index = self.worker()
+        shuffled = super().indices(data_column, epoch)
+        nb_samples = len(shuffled)
+        if nb_samples == 0:
+            return np.zeros([0], np.int64)
+        positions = task_index + nb_workers * np.arange(
+            self._shard_size(nb_samples, nb_workers), dtype=np.int64)
+        result = shuffled[positions % nb_samples]
+        self._cache = (key, result)
+        return result
+
+    def get_capacity(self, data_columns):
+        return self._shard_size(
+            self._partitioner.get_capacity(data_columns), self.worker()[0])
+
+
+class WeightedPartitioner(ShufflePartitioner):
+    """
+    Weighted sampling with replacement from (valid indices of `partitioner`),
+    `nb_samples` (default number of valid indices) draws per epoch.
+
+    `weights` is an array of one weight per sample of data columns (not only
+    valid ones), or a callable of data columns returns it. Draws are O(1) by
+    an `AliasTable`, which is built once for each data columns.
+    """
+
+    def __init__(self,
+                 weights,
+                 nb_samples=None,
+                 seed=0,
+                 partitioner=None,
+                 *,
+                 epoch=0):
+        super().__init__(seed, partitioner, epoch=epoch)
+        self._weights = weights
+        self._nb_samples = nb_samples
+        self._labels = None
+        self._table = None
+        self._cache = None
+
+    def key(self):
+        weights = (['balanced', _spec_key(self._labels)]
+                   if self._labels is not None else _spec_key(self._weights))
+        return super().key() + [weights, self._nb_samples]
+
+    @classmethod
+    def balanced(cls, labels, *args, **kwargs):
+        """
+        Sampler with the same total weight for each class of `labels`, which
+        is a column name, callable of data columns or array like.
+        """
+        result = cls(
+            lambda c: inverse_frequency_weights(_column_values(c, labels)),
+            *args, **kwargs)
+        result._labels = labels
+        return result
+
+    def _alias_table(self, data_column):
+        key = _columns_key(data_column)
+        if self._table is None or self._table[0] != key:
+            base = self._partitioner.indices(data_column)
+            weights = _column_values(data_column, self._weights).reshape(-1)
+            if weights.size != data_column.capacity:
+                raise ValueError("{} weights for {} samples.".format(
+                    weights.size, data_column.capacity))
+            self._table = (key, base,
+                           AliasTable(weights[np.asarray(base)]))
+        return self._table[1], self._table[2]
+
+    def indices(self, data_column, epoch=None):
+        epoch = self.epoch if epoch is None else epoch
+        key = (_columns_key(data_column), self.seed, epoch)
+        if self._cache is not None and self._cache[0] == key:
+            return self._cache[1]
+        base, table = self._alias_table(data_column)
+        rng = np.random.RandomState(permutation_seed(self.seed, epoch) % 2**32)
+        draws = table.sample(self.get_capacity(data_column), rng)
+        if isinstance(base, range):
+            result = base.start + draws * base.step
+        else:
+            result = np.asarray(base)[draws]
+        self._cache = (key, result)
+        return result
+
+    def get_capacity(self, data_columns):
+        if self._nb_samples is not None:
+            return self._nb_samples
+        return self._partitioner.get_capacity(data_columns)
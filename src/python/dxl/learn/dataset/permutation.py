@@ -0,0 +1,117 @@
+"""
+Random permutations with O(1) memory and random access.
+
+`FeistelPermutation` is a bijection on [0, n) built by a balanced Feistel
+network on the smallest even-bit power of two domain covering n, with
+cycle-walking to stay in [0, n). Position k of permutation is computed
+independently of other positions, thus a full shuffle of a very large dataset
+never needs to be materialized.
+
+```Python
+p = FeistelPermutation(786543, seed=permutation_seed(1234, epoch))
+>>> p([0, 1, 2])
+array([402135,  77730, 611273])
+```
+"""
+import numpy as np
+
+_GOLDEN = 0x9E3779B97F4A7C15
+_MASK64 = (1 << 64) - 1
+BLOCK_SIZE = 65536
+
+
+def _mix(x):
+    """
+    splitmix64 finalizer, vectorized on uint64 arrays.
+    """
+    with np.errstate(over='ignore'):
+        x = (x ^ (x >> np.uint64(30))) * np.uint64(0xBF58476D1CE4E5B9)
+        x = (x ^ (x >> np.uint64(27))) * np.uint64(0x94D049BB133111EB)
+        return x ^ (x >> np.uint64(31))
+
+
+def permutation_seed(seed, epoch):
+    """
+    Seed of permutation of `epoch`, derived from a base `seed`.
+    """
+    x = np.array([(seed * _GOLDEN + epoch) & _MASK64], dtype=np.uint64)
+    return int(_mix(x)[0])
+
+
+class FeistelPermutation:
+    def __init__(self, n, seed=0, nb_rounds=4):
+        self.n = int(n)
+        nb_bits = max(2, (self.n - 1).bit_length())
+        nb_bits += nb_bits % 2
+        self._half = np.uint64(nb_bits // 2)
+        self._mask = np.uint64((1 << (nb_bits // 2)) - 1)
+        keys = np.arange(nb_rounds, dtype=np.uint64)
+        with np.errstate(over='ignore'):
+            keys = keys * np.uint64(_GOLDEN) + np.uint64(seed & _MASK64)
+        self._keys = _mix(keys)
+
+    def _permute_once(self, x):
+        left, right = x >> self._half, x & self._mask
+        for k in self._keys:
+            left, right = right, left ^ (_mix(right ^ k) & self._mask)
+        return (left << self._half) | right
+
+    def __call__(self, positions):
+        """
+        Returns permuted values of `positions` (array like of ints in [0, n)).
+        """
+        positions = np.asarray(positions, dtype=np.int64)
+        if positions.size > 0 and (positions.min() < 0
+                                   or positions.max() >= self.n):
+            raise IndexError("Positions out of range [0, {}).".format(self.n))
+        result = self._permute_once(positions.astype(np.uint64))
+        outside = result >= np.uint64(self.n)
+        while np.any(outside):
+            result[outside] = self._permute_once(result[outside])
+            outside = result >= np.uint64(self.n)
+        return result.astype(np.int64)
+
+    def __len__(self):
+        return self.n
+
+
+class PermutedIndices:
+    """
+    Lazy sequence `indices[permutation(k)]`, where `indices` is a range or an
+    array. Supports len, int/slice/array indexing and iteration by blocks.
+    """
+
+    def __init__(self, indices, permutation):
+        if len(indices) != len(permutation):
+            raise ValueError("Length of indices {} and permutation {}.".format(
+                len(indices), len(permutation)))
+        self._indices = indices
+        self._permutation = permutation
+
+    def __len__(self):
+        return len(self._indices)
+
+    def _lookup(self, positions):
+        p = self._permutation(positions)
+        if isinstance(self._indices, range):
+            return self._indices.start + p * self._indices.step
+        return np.asarray(self._indices)[p]
+
+    def __getitem__(self, k):
+        if isinstance(k, slice):
+            return self._lookup(np.arange(*k.indices(len(self))))
+        if np.ndim(k) == 0:
+            k = int(k)
+            if k < 0:
+                k += len(self)
+            return int(self._lookup([k])[0])
+        positions = np.asarray(k, dtype=np.int64)
+        return self._lookup(np.where(positions < 0, positions + len(self),
+                                     positions))
+
+    def __iter__(self):
+        for start in range(0, len(self), BLOCK_SIZE):
+            yield from self[start:start + BLOCK_SIZE].tolist()
+
+    def __array__(self, dtype=None, copy=None):
+        return np.asarray(self[:], dtype=dtype)
@@ -0,0 +1,264 @@
+"""
+Offline preprocessing of PyTables tables into ready-to-use shards.
+
+Per sample processing done at reading time (e.g. padding, transpose,
+normalization of analytical phantom sinograms) is repeated each epoch.
+`preprocess` runs it once over whole tables: rows are split into chunks of
+`shard_size`, each chunk is processed and written as one HDF5 shard by a
+worker process, in blocks of `block_size` samples, thus a worker holds only one
+block in memory. Statistics (mean and std) of each processed field and of each
+family of fields of the same scale (e.g. `SINO_STAT`, `RECON_STAT`) are merged
+from shards and saved in `statistics.json` along with shard list, thus
+shards are read by `load_preprocessed` as `ShardedColumns` without opening
+each of them. Means are shifted by `stat_offsets`, e.g. `STAT_OFFSETS`, which
+is the minimum noise added to analytical phantom sinograms (0.4) and recons
+(1.0), as documented by `Dataset.SINO_STAT` and `Dataset.RECON_STAT`.
+
+```Python
+preprocess(['analytical_phantom_sinogram.h5'], ['sinogram', 'phantom'],
+           'preprocessed', _post_processing, nb_workers=16,
+           stat_offsets=STAT_OFFSETS)
+columns, statistics = load_preprocessed('preprocessed')
+>>> statistics['SINO_STAT']
+{'mean': 9.76, 'std': 9.27}
+```
+"""
+import json
+import os
+import re
+from pathlib import Path
+
+import h5py
+import numpy as np
+import tables as tb
+
+from .parallel import default_mp_context
+from .sharded import ShardedColumns
+
+DEFAULT_SHARD_SIZE = 4096
+DEFAULT_BLOCK_SIZE = 64
+STATISTICS_FILE = 'statistics.json'
+SKIPPED_STAT_FIELDS = ('id', 'phantom_type')
+# minimum noise of analytical phantom sinograms (0.4) and recons (1.0)
+STAT_OFFSETS = {
+    'SINO_STAT': 0.4,
+    'RECON_STAT': 1.0,
+    'RECON_MS_1X_STAT': 1.0,
+    'RECON_MS_2X_STAT': 1.0,
+    'RECON_MS_4X_STAT': 1.0,
+    'RECON_MS_8X_STAT': 1.0,
+}
+
+
+def stat_family(field):
+    """
+    Name of statistic shared by fields of the same scale: sinogram to
+    'SINO_STAT', phantom and recon[1248]x (256x256) to 'RECON_STAT',
+    clean/noise of multi scale recons to 'RECON_MS_[1248]X_STAT', others to
+    upper cased field with suffix '_STAT'.
+    """
+    if field == 'sinogram':
+        return 'SINO_STAT'
+    if field == 'phantom' or re.fullmatch(r'recon\d+x', field):
+        return 'RECON_STAT'
+    scale = re.fullmatch(r'(?:clean|noise)(\d+x)', field)
+    if scale:
+        return 'RECON_MS_{}_STAT'.format(scale.group(1).upper())
+    return '{}_STAT'.format(field.upper())
+
+
+def _find_nodes(files, table, fields):
+    """
+    Table node of each field, which is the first one has it.
+    """
+    nodes = {}
+    for f in files:
+        node = f.get_node(table)
+        for k in fields:
+            if k not in nodes and k in node.colnames:
+                nodes[k] = node
+    missing = [k for k in fields if k not in nodes and k != 'id']
+    if missing:
+        raise ValueError("Fields {} not found in {}.".format(
+            missing, [f.filename for f in files]))
+    return nodes
+
+
+def _read_rows(nodes, fields, start, stop):
+    """
+    Read `fields` of rows [start, stop), 'id' is the row index.
+    """
+    result = {k: nodes[k].read(start, stop, field=k) for k in nodes}
+    if 'id' in fields:
+        result['id'] = np.arange(start, stop, dtype=np.int64)
+    return result
+
+
+def _moments(x):
+    x = np.asarray(x, dtype=np.float64)
+    mean = float(np.mean(x)) if x.size else 0.0
+    return [x.size, mean, float(np.sum(np.square(x - mean)))]
+
+
+def _merge_moments(a, b):
+    """
+    Merge (count, mean, sum of squared deviations) of two parts.
+    """
+    n = a[0] + b[0]
+    if n == 0:
+        return [0, 0.0, 0.0]
+    delta = b[1] - a[1]
+    return [
+        n, a[1] + delta * b[0] / n, a[2] + b[2] + delta**2 * a[0] * b[0] / n
+    ]
+
+
+def _as_stat(moments, offset=0.0):
+    return {
+        'mean': moments[1] + offset,
+        'std': float(np.sqrt(moments[2] / max(moments[0], 1)))
+    }
+
+
+def _process_block(nodes, fields, process, start, stop, dtype):
+    rows = _read_rows(nodes, fields, start, stop)
+    samples = []
+    for i in range(stop - start):
+        sample = {k: rows[k][i] for k in fields}
+        if process is not None:
+            sample = process(sample)
+        samples.append(sample)
+    result = {}
+    for k in samples[0]:
+        v = np.stack([s[k] for s in samples])
+        if np.issubdtype(v.dtype, np.floating):
+            v = v.astype(dtype)
+        result[k] = v
+    return result
+
+
+def _preprocess_shard(args):
+    (sources, table, fields, process, start, stop, path, dtype,
+     block_size) = args
+    moments = {}
+    path_tmp = path + '.tmp'
+    files = [tb.open_file(p, mode='r') for p in sources]
+    try:
+        nodes = _find_nodes(files, table, fields)
+        with h5py.File(path_tmp, 'w') as fout:
+            for begin in range(start, stop, block_size):
+                end = min(begin + block_size, stop)
+                block = _process_block(nodes, fields, process, begin, end,
+                                       dtype)
+                for k, v in block.items():
+                    if k not in fout:
+                        fout.create_dataset(
+                            k, shape=(stop - start, ) + v.shape[1:],
+                            dtype=v.dtype)
+                    fout[k][begin - start:end - start] = v
+                    if k not in SKIPPED_STAT_FIELDS:
+                        moments[k] = _merge_moments(
+                            moments.get(k, [0, 0.0, 0.0]), _moments(v))
+    finally:
+        for f in files:
+            f.close()
+    os.replace(path_tmp, path)
+    return os.path.basename(path), stop - start, moments
+
+
+def preprocess(sources,
+               fields,
+               output,
+               process=None,
+               *,
+               table='/data',
+               shard_size=DEFAULT_SHARD_SIZE,
+               block_size=DEFAULT_BLOCK_SIZE,
+               nb_workers=None,
+               dtype=np.float32,
+               mp_context=None,
+               stat_offsets=None):
+    """
+    Args:
+        sources: list of PyTables files, each field is read from the first
+            file whose `table` has it, e.g. sinogram file and recon files.
+        fields: fields to read, 'id' is row index.
+        output: directory of shards and statistics.
+        process: picklable callable maps a dict of fields of one sample to
+            processed dict, e.g. `_post_processing` of analytical phantom
+            sinogram.
+        shard_size: number of samples of each shard (and chunk of work).
+        block_size: number of samples processed and written at a time.
+        nb_workers: number of worker processes, default to number of cpus.
+        dtype: dtype of float fields in shards, np.float32 or np.float16.
+        mp_context: multiprocessing context of workers, default to
+            `parallel.default_mp_context()`, thus workers are not forked
+            from a process which has imported TensorFlow.
+        stat_offsets: dict of family (e.g. 'SINO_STAT') to offset added to
+            means of the family and of its fields, e.g. `STAT_OFFSETS`.
+    Returns:
+        statistics, which is also saved to `output`/statistics.json.
+    """
+    if isinstance(fields, str):
+        fields = (fields, )
+    if shard_size < 1 or block_size < 1:
+        raise ValueError("Invalid shard_size {} or block_size {}.".format(
+            shard_size, block_size))
+    sources = [str(s) for s in sources]
+    nb_samples = None
+    for path in sources:
+        with tb.open_file(path, mode='r') as fin:
+            nb_rows = int(fin.get_node(table).nrows)
+        nb_samples = nb_rows if nb_samples is None else min(
+            nb_samples, nb_rows)
+    Path(output).mkdir(parents=True, exist_ok=True)
+    tasks = []
+    for i, start in enumerate(range(0, nb_samples, shard_size)):
+        path = str(Path(output) / 'data.{}.h5'.format(i))
+        tasks.append((sources, table, tuple(fields), process, start,
+                      min(start + shard_size, nb_samples), path,
+                      np.dtype(dtype), block_size))
+    context = mp_context or default_mp_context()
+    with context.Pool(nb_workers) as pool:
+        results = pool.map(_preprocess_shard, tasks, chunksize=1)
+    moments = {}
+    for _, _, m in results:
+        for k, v in m.items():
+            moments[k] = _merge_moments(moments.get(k, [0, 0.0, 0.0]), v)
+    families = {}
+    for k, v in moments.items():
+        families[stat_family(k)] = _merge_moments(
+            families.get(stat_family(k), [0, 0.0, 0.0]), v)
+    offsets = dict(stat_offsets or {})
+    statistics = {
+        'nb_samples': nb_samples,
+        'dtype': np.dtype(dtype).name,
+        'shards': [r[0] for r in results],
+        'capacities': [r[1] for r in results],
+        'stat_offsets': offsets,
+        'fields': {
+            k: _as_stat(v, offsets.get(stat_family(k), 0.0))
+            for k, v in moments.items()
+        },
+    }
+    statistics.update(
+        {k: _as_stat(v, offsets.get(k, 0.0))
+         for k, v in families.items()})
+    with open(str(Path(output) / STATISTICS_FILE), 'w') as fout:
+        json.dump(statistics, fout, indent=2)
+    return statistics
+
+
+def load_preprocessed(directory, **kwargs):
+    """
+    Returns (ShardedColumns of shards, statistics) of output of `preprocess`,
+    all shards are kept open by default (`max_open`).
+    """
+    with open(str(Path(directory) / STATISTICS_FILE)) as fin:
+        statistics = json.load(fin)
+    kwargs.setdefault('max_open', len(statistics['shards']))
+    columns = ShardedColumns(
+        [str(Path(directory) / s) for s in statistics['shards']],
+        capacities=statistics['capacities'],
+        **kwargs)
+    return columns, statistics
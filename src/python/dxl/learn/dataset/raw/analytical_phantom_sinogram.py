@@ -139,14 +139,49 @@ def _get_example(idx, fields, h5sino, h5recon, h5recon_ms):
     return result
 
 
-def dataset_generator(fields=('sinogram',), ids=None):
-    if ids is None:
-        ids = range(0, int(NB_IMAGES * 0.8))
-        ids = list(ids)
-        import random
-        random.shuffle(ids)
+def _preprocessed_generator(fields, ids, preprocessed, block_size=64):
+    """
+    Samples of output of `dxlearn dataset preprocess`, read by blocks of
+    `block_size` samples. If `ids` is None, training samples are read with
+    shards in random order and samples shuffled inside shards, thus each block
+    is read from one shard.
+    """
+    import random
+    from ..preprocess import load_preprocessed
+    columns, _ = load_preprocessed(preprocessed)
+    try:
+        if ids is None:
+            ids = columns.shuffled_indices(random.getrandbits(32))
+            ids = ids[ids < int(NB_IMAGES * 0.8)]
+        ids = np.asarray(ids, dtype=np.int64)
+        for begin in range(0, len(ids), block_size):
+            batch = columns.get_batch(ids[begin:begin + block_size])
+            for i in range(len(batch[fields[0]])):
+                yield {k: batch[k][i].astype(data_type_np(k), copy=False)
+                       for k in fields}
+    finally:
+        columns.close()
+
+
+def dataset_generator(fields=('sinogram',), ids=None, preprocessed=None):
+    """
+    `preprocessed`: optional output directory of `dxlearn dataset preprocess`,
+    whose samples are already post processed.
+    """
     if isinstance(fields, str):
         fields = (fields, )
+    if preprocessed is not None:
+        yield from _preprocessed_generator(fields, ids, preprocessed)
+        return
+    if ids is None:
+        import random
+        from ..permutation import (FeistelPermutation, PermutedIndices,
+                                   permutation_seed)
+        ids = range(0, int(NB_IMAGES * 0.8))
+        ids = PermutedIndices(
+            ids,
+            FeistelPermutation(
+                len(ids), permutation_seed(random.getrandbits(63), 0)))
     from dxpy.debug.utils import dbgmsg
     dbgmsg(ids[0], ids[1], ids[10], ids[-1])
     fn_sino, fn_recon, fn_recon_ms = _h5files()
@@ -187,7 +222,10 @@ class Dataset(Graph):
             ids = list(range(0, NB_IMAGES))
         dataset_gen_partial = partial(dataset_generator,
                                       fields=self.param('fields'),
-                                      ids=ids)
+                                      ids=ids,
+                                      preprocessed=self.param(
+                                          'preprocessed',
+                                          raise_key_error=False))
         output_types = {k: data_type_tf(k) for k in self.param('fields')}
         output_shapes = {k: data_shape(k) for k in self.param('fields')}
         return tf.data.Dataset.from_generator(dataset_gen_partial, output_types, output_shapes)
@@ -0,0 +1,110 @@
+"""
+Resumable reading of DataColumns.
+
+Reading position (number of samples delivered since the first epoch, thus
+epoch and offset in epoch) and shuffle seed are kept in variables of
+`IteratorState`, hence saved and restored by `tf.train.Saver` checkpoints
+(e.g. `network.saver.Saver`) together with model variables. Dataset is read by
+an initializable iterator, which starts from the restored position directly:
+order of each epoch is computed from (seed, epoch) by an epoch dependent
+partitioner (e.g. `ShufflePartitioner`), thus previous samples are not read.
+
+Initializers of resumable iterators are collected in `RESUMABLE_INITIALIZERS`,
+they are run by `initialize_resumable_datasets` after variables are initialized
+or restored.
+"""
+import itertools
+
+import numpy as np
+import tensorflow as tf
+
+from .data_column import DataColumns, DataColumnsPartition, _stack_samples
+from .partitioner import ShufflePartitioner
+
+RESUMABLE_INITIALIZERS = 'resumable_dataset_initializers'
+
+
+def initialize_resumable_datasets(session):
+    initializers = tf.compat.v1.get_collection(RESUMABLE_INITIALIZERS)
+    if len(initializers) > 0:
+        session.run(initializers)
+
+
+class IteratorState:
+    def __init__(self, name, seed=0):
+        with tf.name_scope(name):
+            self.position = tf.Variable(
+                0, dtype=tf.int64, trainable=False, name='position')
+            self.seed = tf.Variable(
+                seed, dtype=tf.int64, trainable=False, name='seed')
+
+
+def with_shuffle(columns, seed=0):
+    """
+    `columns` in order of a `ShufflePartitioner`, which is a global shuffle
+    and, unlike a shuffle buffer, resumable.
+    """
+    partitioner = getattr(columns, 'partitioner', None)
+    if partitioner is not None and partitioner.is_epoch_dependent:
+        return columns
+    if isinstance(columns, DataColumnsPartition):
+        return DataColumnsPartition(columns.data,
+                                    ShufflePartitioner(seed, partitioner))
+    return DataColumnsPartition(columns, ShufflePartitioner(seed))
+
+
+def _iter_epoch(columns, epoch, offset, read_batch_size):
+    partitioner = getattr(columns, 'partitioner', None)
+    if partitioner is not None and partitioner.is_epoch_dependent:
+        order = partitioner.indices(columns.data, epoch=epoch)
+        for start in range(offset, len(order), read_batch_size):
+            yield columns.data.get_batch(
+                np.asarray(order[start:start + read_batch_size]))
+    elif type(columns).get_batch is not DataColumns.get_batch:
+        for start in range(offset, columns.capacity, read_batch_size):
+            yield columns.get_batch(
+                slice(start, min(start + read_batch_size, columns.capacity)))
+    else:
+        # no random access, samples before offset are skipped by reading
+        samples = itertools.islice(iter(columns), offset, None)
+        while True:
+            block = list(itertools.islice(samples, read_batch_size))
+            if len(block) == 0:
+                return
+            yield _stack_samples(block)
+
+
+def resumable_batches(columns, read_batch_size, nb_epochs=None):
+    """
+    Generator function `f(position, seed)` of blocks of at most
+    `read_batch_size` samples of `columns`, starting from sample `position`
+    (counted over epochs), with shuffle `seed` of partitioner of `columns`.
+    """
+
+    def generator(position, seed):
+        partitioner = getattr(columns, 'partitioner', None)
+        if hasattr(partitioner, 'seed'):
+            partitioner.seed = int(seed)
+        epoch, offset = divmod(int(position), max(columns.capacity, 1))
+        while nb_epochs is None or epoch < nb_epochs:
+            yield from _iter_epoch(columns, epoch, offset, read_batch_size)
+            epoch, offset = epoch + 1, 0
+
+    return generator
+
+
+def make_resumable_iterator(dataset, state):
+    """
+    Returns next element of initializable iterator of `dataset`, evaluating it
+    advances `state.position` by the number of samples in it.
+    """
+    iterator = tf.compat.v1.data.make_initializable_iterator(dataset)
+    tf.compat.v1.add_to_collection(RESUMABLE_INITIALIZERS,
+                                   iterator.initializer)
+    result = iterator.get_next()
+    first = next(iter(result.values())) if isinstance(result, dict) else result
+    nb_samples = tf.cast(tf.shape(first)[0], tf.int64)
+    with tf.control_dependencies([state.position.assign_add(nb_samples)]):
+        if isinstance(result, dict):
+            return {k: tf.identity(v) for k, v in result.items()}
+        return tf.identity(result)
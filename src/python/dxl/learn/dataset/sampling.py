@@ -0,0 +1,93 @@
+"""
+Weighted sampling with replacement by Walker alias tables.
+
+`AliasTable` is built in O(n) by vectorized numpy, then each draw costs O(1):
+a uniform column `k` and a uniform `u`, result is `k` if `u < prob[k]`
+otherwise `alias[k]`.
+
+```Python
+labels = columns.get_batch(slice(0, columns.capacity))['phantom_type']
+table = AliasTable(inverse_frequency_weights(labels))
+>>> table.sample(4, np.random.RandomState(0))
+array([ 5123, 70512,  2412, 60021])
+```
+"""
+import numpy as np
+
+
+def inverse_frequency_weights(labels):
+    """
+    Weights `1 / count(label)` of each sample, thus each class has the same
+    total weight.
+    """
+    _, inverse, counts = np.unique(
+        np.asarray(labels), return_inverse=True, return_counts=True)
+    return 1.0 / counts[inverse.reshape(-1)]
+
+
+class AliasTable:
+    def __init__(self, weights):
+        weights = np.asarray(weights, dtype=np.float64).reshape(-1)
+        if weights.size == 0:
+            raise ValueError("Weights should not be empty.")
+        if np.any(weights < 0) or not np.all(np.isfinite(weights)):
+            raise ValueError("Weights should be finite and non-negative.")
+        total = weights.sum()
+        if total <= 0:
+            raise ValueError("Sum of weights should be positive.")
+        self.prob, self.alias = self._build(weights * (weights.size / total))
+
+    @staticmethod
+    def _build(p):
+        """
+        Vectorized Vose construction. Deficits `1 - p` of small columns tile
+        [0, D), surpluses `p - 1` of large columns tile the same [0, D) at
+        cut points `c`. A small column aliases the large one where its deficit
+        starts; a large column whose surplus ends inside deficit of a small one
+        gives the overshoot to the next large one, by aliasing to it.
+        """
+        n = p.size
+        prob = np.ones(n)
+        alias = np.arange(n)
+        small = np.flatnonzero(p < 1.0)
+        large = np.flatnonzero(p >= 1.0)
+        if small.size == 0 or large.size == 0:
+            return prob, alias
+        deficit_end = np.cumsum(1.0 - p[small])
+        deficit_start = deficit_end - (1.0 - p[small])
+        cut = np.cumsum(p[large] - 1.0)
+        owner = np.minimum(
+            np.searchsorted(cut, deficit_start, side='right'), large.size - 1)
+        prob[small] = p[small]
+        alias[small] = large[owner]
+        containing = np.searchsorted(deficit_end, cut, side='right')
+        overshoot = np.zeros(large.size)
+        inside = containing < small.size
+        inside[inside] = deficit_start[containing[inside]] < cut[inside]
+        overshoot[inside] = np.maximum(
+            0.0, deficit_end[containing[inside]] - cut[inside])
+        overshoot[-1] = 0.0
+        prob[large] = np.clip(1.0 - overshoot, 0.0, 1.0)
+        has_next = overshoot > 0
+        alias[large[has_next]] = large[np.flatnonzero(has_next) + 1]
+        return prob, alias
+
+    def __len__(self):
+        return self.prob.size
+
+    def sample(self, size, random_state=None):
+        """
+        Draw `size` indices with replacement.
+        """
+        rng = random_state or np.random
+        k = rng.randint(0, self.prob.size, size=size)
+        u = rng.random_sample(size)
+        return np.where(u < self.prob[k], k, self.alias[k]).astype(np.int64)
+
+    def probabilities(self):
+        """
+        Sampling probability of each index, for checking.
+        """
+        result = self.prob.copy()
+        np.add.at(result, self.alias, 1.0 - self.prob)
+        return result / self.prob.size
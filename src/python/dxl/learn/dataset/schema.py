@@ -0,0 +1,116 @@
+"""
+Persistent schema (capacity, dtypes and shapes) of columns stored in files.
+
+Schema of nodes of a file is saved next to it as `<file>.schema.json`, and
+reused on later opens as long as mtime and size of the file are unchanged, thus
+opening large tables does not need to scan any data.
+
+```Python
+schema = cached_schema('phantoms.h5', '/data', lambda: compute_schema())
+>>> schema.capacity
+786543
+```
+"""
+import json
+import os
+
+import numpy as np
+
+SUFFIX = '.schema.json'
+
+
+class Schema:
+    def __init__(self, capacity, dtypes, shapes):
+        """
+        `dtypes`, `shapes`: dicts from column name to dtype and shape of one
+        sample.
+        """
+        self.capacity = int(capacity)
+        self.dtypes = {k: np.dtype(v) for k, v in dtypes.items()}
+        self.shapes = {k: tuple(int(s) for s in v) for k, v in shapes.items()}
+
+    def to_dict(self):
+        return {
+            'capacity': self.capacity,
+            'columns': {
+                k: {
+                    'dtype': self.dtypes[k].str,
+                    'shape': list(self.shapes[k])
+                }
+                for k in self.dtypes
+            }
+        }
+
+    @classmethod
+    def from_dict(cls, data):
+        columns = data['columns']
+        return cls(data['capacity'],
+                   {k: v['dtype'] for k, v in columns.items()},
+                   {k: v['shape'] for k, v in columns.items()})
+
+    @property
+    def columns(self):
+        return tuple(self.dtypes.keys())
+
+
+def schema_path(path_file):
+    return str(path_file) + SUFFIX
+
+
+def _source_stat(path_file):
+    stat = os.stat(str(path_file))
+    return {'mtime': stat.st_mtime_ns, 'size': stat.st_size}
+
+
+def _load_nodes(path_file):
+    try:
+        with open(schema_path(path_file)) as fin:
+            content = json.load(fin)
+        if content.get('source') != _source_stat(path_file):
+            return {}
+        return content.get('nodes', {})
+    except (OSError, ValueError):
+        return {}
+
+
+def load_schema(path_file, node):
+    """
+    Returns saved `Schema` of `node` in `path_file`, or None if not saved or
+    file changed since saved.
+    """
+    data = _load_nodes(path_file).get(node)
+    if data is None:
+        return None
+    return Schema.from_dict(data)
+
+
+def save_schema(path_file, node, schema):
+    """
+    Save schema of `node`, failures (e.g. read only directory) are ignored
+    since schema is only a cache.
+    """
+    nodes = _load_nodes(path_file)
+    nodes[node] = schema.to_dict()
+    path_tmp = '{}.{}.tmp'.format(schema_path(path_file), os.getpid())
+    try:
+        with open(path_tmp, 'w') as fout:
+            json.dump({
+                'source': _source_stat(path_file),
+                'nodes': nodes
+            }, fout, indent=4)
+        os.replace(path_tmp, schema_path(path_file))
+    except OSError:
+        if os.path.exists(path_tmp):
+            os.remove(path_tmp)
+
+
+def cached_schema(path_file, node, make_schema):
+    """
+    Returns saved schema of `node` if valid, otherwise calls `make_schema`
+    and saves its result.
+    """
+    schema = load_schema(path_file, node)
+    if schema is None:
+        schema = make_schema()
+        save_schema(path_file, node, schema)
+    return schema
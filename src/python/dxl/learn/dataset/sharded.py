@@ -0,0 +1,150 @@
+"""
+Columns over many shard files, e.g. `phantom.0.h5`, `phantom.1.h5`, ...
+
+Global index is mapped to (shard, local index) by binary search over
+cumulative capacities of shards. Shards are opened lazily, at most `max_open`
+of them are kept open at the same time (least recently used ones are closed).
+
+```Python
+c = ShardedColumns(['phantom.{}.h5'.format(i) for i in range(16)])
+>>> c.capacity
+786543
+batch = c.get_batch(c.shuffled_indices(seed=epoch)[:128])
+```
+"""
+from collections import OrderedDict
+
+import numpy as np
+
+from .data_column import (DataColumnsWithGetItem, HDF5DataColumns,
+                          NPYDataColumns, NPZDataColumns, _as_indices)
+
+
+def default_shard_factory(path):
+    """
+    Columns of a shard file chosen by its suffix, .npy and .npz files are
+    memory mapped.
+    """
+    path_str = str(path)
+    if path_str.endswith('.npy'):
+        return NPYDataColumns(path, mmap_mode='r')
+    if path_str.endswith('.npz'):
+        return NPZDataColumns(path, mmap_mode='r')
+    if path_str.endswith(('.h5', '.hdf5')):
+        return HDF5DataColumns(path)
+    raise ValueError("Unknown shard file type {}.".format(path_str))
+
+
+class ShardedColumns(DataColumnsWithGetItem):
+    def __init__(self,
+                 shards,
+                 shard_factory=default_shard_factory,
+                 *,
+                 max_open=8,
+                 capacities=None):
+        """
+        Args:
+            shards: list of shard paths.
+            shard_factory: callable maps a shard path to its `DataColumns`.
+            max_open: maximum number of shards opened at the same time.
+            capacities: optional capacities of shards, if None, each shard is
+                opened once to read its capacity.
+        """
+        self._factory = shard_factory
+        self._max_open = max(1, max_open)
+        self._opened = OrderedDict()
+        self._capacities = capacities
+        super().__init__(list(shards))
+        if self._capacities is None:
+            self._capacities = [
+                self._shard(i).capacity for i in range(len(self.data))
+            ]
+        if len(self._capacities) != len(self.data):
+            raise ValueError("{} capacities for {} shards.".format(
+                len(self._capacities), len(self.data)))
+        self._offsets = np.concatenate([[0], np.cumsum(self._capacities)])
+
+    @property
+    def nb_shards(self):
+        return len(self.data)
+
+    def _shard(self, i):
+        if i in self._opened:
+            self._opened.move_to_end(i)
+            return self._opened[i]
+        columns = self._factory(self.data[i])
+        self._opened[i] = columns
+        while len(self._opened) > self._max_open:
+            _, evicted = self._opened.popitem(last=False)
+            if hasattr(evicted, 'close'):
+                evicted.close()
+        return columns
+
+    def locate(self, indices):
+        """
+        Returns (shard ids, local indices) of global `indices`.
+        """
+        indices = np.asarray(indices, dtype=np.int64)
+        if np.any(indices < 0) or np.any(indices >= self.capacity):
+            raise IndexError("Index out of range [0, {}).".format(
+                self.capacity))
+        shards = np.searchsorted(self._offsets, indices, side='right') - 1
+        return shards, indices - self._offsets[shards]
+
+    def _calculate_capacity(self):
+        return int(self._offsets[-1])
+
+    @property
+    def columns(self):
+        return self._shard(0).columns
+
+    @property
+    def types(self):
+        return self._shard(0).types
+
+    @property
+    def shapes(self):
+        return self._shard(0).shapes
+
+    def __getitem__(self, i):
+        if isinstance(i, slice):
+            return self.get_batch(i)
+        shards, local = self.locate(i)
+        return self._shard(int(shards))[int(local)]
+
+    def get_batch(self, indices):
+        indices = _as_indices(indices, self.capacity)
+        if indices.size == 0:
+            return self._shard(0).get_batch(slice(0, 0))
+        shards, local = self.locate(indices)
+        order = np.argsort(shards, kind='stable')
+        splits = np.flatnonzero(np.diff(shards[order])) + 1
+        parts = [
+            self._shard(int(shards[g[0]])).get_batch(local[g])
+            for g in np.split(order, splits)
+        ]
+        inverse = np.empty_like(order)
+        inverse[order] = np.arange(order.size)
+        if isinstance(parts[0], dict):
+            return {
+                k: np.concatenate([p[k] for p in parts])[inverse]
+                for k in parts[0]
+            }
+        return np.concatenate(parts)[inverse]
+
+    def shuffled_indices(self, seed=None):
+        """
+        Global indices with shards in random order and samples shuffled only
+        inside their shard, thus each shard is read as a whole for locality.
+        """
+        rng = np.random.RandomState(seed)
+        return np.concatenate([
+            self._offsets[s] + rng.permutation(self._capacities[s])
+            for s in rng.permutation(self.nb_shards)
+        ])
+
+    def close(self):
+        for columns in self._opened.values():
+            if hasattr(columns, 'close'):
+                columns.close()
+        self._opened.clear()
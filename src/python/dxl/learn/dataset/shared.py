@@ -0,0 +1,234 @@
+"""
+Node wide shared memory residency of decoded columns.
+
+Many processes (e.g. trainings of a grid search) reading the same file each
+decode and hold their own copy of it. `SharedColumns` places decoded arrays of
+columns in one `multiprocessing.shared_memory` segment, named by hash of the
+source (file path, mtime, size, node and columns, see `filtered.source_key`).
+The first process loads columns into the segment, later ones attach to it
+read-only instead of reloading.
+
+Users of a segment are registered by pid in a registry file (guarded by an
+exclusive file lock) next to it, the segment is unlinked when its last user
+closes it or exits; users died without closing are pruned from registry.
+
+```Python
+photons = SharedColumns(PyTablesColumns('gamma_photon_5.h5', '/photons'))
+>>> photons.is_creator
+False
+batch = photons.get_batch(indices)
+```
+"""
+import atexit
+import fcntl
+import hashlib
+import json
+import os
+import struct
+import tempfile
+from contextlib import contextmanager
+from multiprocessing import shared_memory
+
+import numpy as np
+import tensorflow as tf
+
+from .data_column import CachedColumns, NDArrayColumns
+from .parallel import _align, _attach
+
+PREFIX = 'dxl_'
+DEFAULT_BATCH_SIZE = 4096
+# segment starts with header: magic (set once fully written) and length of
+# JSON layout, then the JSON layout, then arrays at aligned offsets relative
+# to the aligned end of layout.
+_MAGIC = 0x44584c5348415245
+_HEADER = struct.Struct('<QQ')
+
+
+def segment_name(columns, key=None):
+    """
+    Name of shared memory segment of `columns`, from `key` (a JSON
+    compatible identity of content), default to key of source file.
+    """
+    if key is None:
+        from .filtered import source_key
+        _, key = source_key(columns)
+        if key is None:
+            raise ValueError(
+                "Columns {} is not backed by a file, key is required.".format(
+                    type(columns).__name__))
+        key = [key, sorted(columns.columns)]
+    digest = hashlib.sha1(json.dumps(key, default=str).encode()).hexdigest()
+    return PREFIX + digest[:16]
+
+
+def _is_alive(pid):
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True
+    return True
+
+
+@contextmanager
+def _registry(path):
+    """
+    Exclusively locked list of live user pids of a segment, saved on exit.
+    """
+    with open(path, 'a+') as f:
+        fcntl.flock(f, fcntl.LOCK_EX)
+        try:
+            f.seek(0)
+            content = f.read()
+            users = [p for p in json.loads(content or '[]') if _is_alive(p)]
+            yield users
+            f.seek(0)
+            f.truncate()
+            json.dump(users, f)
+        finally:
+            fcntl.flock(f, fcntl.LOCK_UN)
+
+
+def _untracked(shm):
+    # segments outlive their creator, avoid its resource tracker unlinking
+    # them on exit.
+    try:
+        from multiprocessing import resource_tracker
+        resource_tracker.unregister(shm._name, 'shared_memory')
+    except Exception:
+        pass
+    return shm
+
+
+def _data_start(header):
+    return _align(_HEADER.size + len(header))
+
+
+def _read_layout(shm):
+    """
+    Returns (layout, start of arrays), or None if segment is not completed.
+    """
+    magic, size = _HEADER.unpack_from(shm.buf, 0)
+    if magic != _MAGIC:
+        return None
+    header = bytes(shm.buf[_HEADER.size:_HEADER.size + size])
+    return json.loads(header), _data_start(header)
+
+
+def _create(name, columns, batch_size):
+    types, shapes = columns.types, columns.shapes
+    if not isinstance(types, dict):
+        types = {CachedColumns.K.DATA: types}
+        shapes = {CachedColumns.K.DATA: shapes}
+    capacity = columns.capacity
+    layout, offset = {'capacity': capacity, 'columns': {}}, 0
+    for k in types:
+        dtype = np.dtype(tf.as_dtype(types[k]).as_numpy_dtype)
+        shape = [capacity] + list(shapes[k])
+        layout['columns'][k] = [offset, dtype.str, shape]
+        offset = _align(offset + dtype.itemsize * int(np.prod(shape)))
+    header = json.dumps(layout).encode()
+    shm = _untracked(
+        shared_memory.SharedMemory(name=name, create=True,
+                                   size=_data_start(header) + max(offset, 1)))
+    try:
+        arrays = _views(shm, layout, _data_start(header), writeable=True)
+        position = 0
+        for batch in columns.iter_batches(batch_size):
+            if not isinstance(batch, dict):
+                batch = {CachedColumns.K.DATA: batch}
+            nb_samples = len(next(iter(batch.values())))
+            for k, v in batch.items():
+                arrays[k][position:position + nb_samples] = v
+            position += nb_samples
+        if position != capacity:
+            raise ValueError("Got {} samples, while capacity is {}.".format(
+                position, capacity))
+        del arrays
+        shm.buf[_HEADER.size:_HEADER.size + len(header)] = header
+        _HEADER.pack_into(shm.buf, 0, _MAGIC, len(header))
+    except BaseException:
+        shm.close()
+        shm.unlink()
+        raise
+    return shm
+
+
+def _views(shm, layout, start, writeable=False):
+    result = {}
+    for k, (offset, dtype, shape) in layout['columns'].items():
+        v = np.ndarray(shape, np.dtype(dtype), buffer=shm.buf,
+                       offset=start + offset)
+        v.flags.writeable = writeable
+        result[k] = v
+    return result
+
+
+class SharedColumns(NDArrayColumns):
+    def __init__(self,
+                 columns,
+                 key=None,
+                 *,
+                 batch_size=DEFAULT_BATCH_SIZE,
+                 registry_dir=None):
+        """
+        `columns`: source columns, read only if segment does not exist.
+        `key`: JSON compatible identity of content of `columns`, required if
+        it is not backed by a file.
+        `batch_size`: number of samples of each read when loading.
+        `registry_dir`: directory of registry files, default to temporary
+        directory of system.
+        """
+        self.name = segment_name(columns, key)
+        self._registry_path = os.path.join(
+            registry_dir or tempfile.gettempdir(), self.name + '.users')
+        self._batch_size = batch_size
+        self._shm = None
+        self.is_creator = False
+        super().__init__(columns)
+        atexit.register(self.close)
+
+    def _process(self, columns):
+        with _registry(self._registry_path) as users:
+            shm, layout = self._attach()
+            if shm is None:
+                shm = _create(self.name, columns, self._batch_size)
+                layout, self.is_creator = _read_layout(shm), True
+            self._shm = shm
+            users.append(os.getpid())
+        self._capacity = layout[0]['capacity']
+        return _views(shm, *layout)
+
+    def _attach(self):
+        try:
+            shm = _attach(self.name)
+        except FileNotFoundError:
+            return None, None
+        layout = _read_layout(shm)
+        if layout is None:
+            # left by a creator died while loading
+            shm.close()
+            shm.unlink()
+            return None, None
+        return shm, layout
+
+    def _calculate_capacity(self):
+        return self._capacity
+
+    def close(self):
+        if self._shm is None:
+            return
+        shm, self._shm = self._shm, None
+        self.data = {}
+        with _registry(self._registry_path) as users:
+            if os.getpid() in users:
+                users.remove(os.getpid())
+            if len(users) == 0:
+                shm.unlink()
+        try:
+            shm.close()
+        except BufferError:
+            # views returned by get_batch still refer to segment, it is
+            # unmapped once they are released.
+            pass
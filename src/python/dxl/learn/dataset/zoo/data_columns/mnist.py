@@ -2,6 +2,6 @@ from ...data_column import PyTablesColumns
 
 
 class MNISTColumns(PyTablesColumns):
-    def __init__(self, path_file, is_train):
+    def __init__(self, path_file, is_train, columns=None):
         path_dataset = '/train' if is_train else '/test'
-        super().__init__(path_file, path_dataset)
\ No newline at end of file
+        super().__init__(path_file, path_dataset, columns)
\ No newline at end of file
@@ -102,3 +102,6 @@ class Saver(Graph):
                 return
         print("[LOAD] model from: {}.".format(path_load))
         self.saver.restore(ThisSession.session(), path_load)
+        # restart resumable datasets from restored iterator states
+        from dxl.learn.dataset.resumable import initialize_resumable_datasets
+        initialize_resumable_datasets(ThisSession.session())
@@ -77,8 +77,10 @@ class TensorFlowSession(AbstractSession):
         ThisSession.reset()
 
     def init(self):
+        from dxl.learn.dataset.resumable import initialize_resumable_datasets
         self.session.run(tf.global_variables_initializer())
         self.session.run(tf.local_variables_initializer())
+        initialize_resumable_datasets(self.session)
         self.is_init = True
 
 
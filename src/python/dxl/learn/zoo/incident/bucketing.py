@@ -0,0 +1,98 @@
+"""
+Batching of incident photons by number of true hits.
+
+Hits of photons in incident tables are padded to a fixed `padding_size`, with
+padded hits at the end of `hits` and their number in `padded_size`. Padding
+is removed, photons are grouped into buckets of similar number of true hits
+and each batch is padded only to its bucket (1, 2, 4, ..., `padding_size`
+hits by default), thus most of batches are much narrower than
+`padding_size`.
+
+```Python
+dataset = bucketed_dataset(photons, 32, True, padding_size=10)
+>>> dataset.output_shapes
+{'hits': [None, None, 4], 'first_hit_index': [None, None], 'padded_size': [None]}
+```
+"""
+import tensorflow as tf
+
+from dxl.learn.dataset.dataset import AUTOTUNE, BucketByLength, _block_shapes
+
+DEFAULT_READ_BATCH_SIZE = 256
+
+
+def default_bucket_boundaries(padding_size):
+    """
+    Boundaries of buckets of hits padded to 1, 2, 4, ..., `padding_size`.
+    """
+    widths, w = [], 1
+    while w < padding_size:
+        widths.append(w)
+        w *= 2
+    return [w + 1 for w in widths + [padding_size]]
+
+
+def unpad_hits(hits, first_hit_index, padded_size):
+    """
+    Drop padded hits of one photon. Padded hits are assumed to be the last
+    `padded_size` ones of `hits`, as written by incident tables.
+    """
+    nb_true_hits = tf.shape(hits)[0] - tf.cast(padded_size, tf.int32)
+    return {
+        'hits': hits[:nb_true_hits],
+        'first_hit_index': first_hit_index,
+        'nb_true_hits': nb_true_hits
+    }
+
+
+def get_nb_true_hits(sample):
+    return sample['nb_true_hits']
+
+
+def bucket_labels(tensors):
+    """
+    One hot first hit index and padded size of a bucketed batch, both in
+    width (number of hits) of this batch.
+    """
+    width = tf.shape(tensors['hits'])[1]
+    return {
+        'hits': tensors['hits'],
+        'first_hit_index': tf.one_hot(tensors['first_hit_index'], width),
+        'padded_size': width - tensors['nb_true_hits']
+    }
+
+
+def _to_dataset(columns):
+    if hasattr(columns, 'dataclass'):
+        from dxl.learn.dataset.dataset import ColumnsToTensorFlowDataset
+        return ColumnsToTensorFlowDataset(True)(columns)
+    dataset = tf.data.Dataset.from_generator(
+        lambda: columns.iter_batches(DEFAULT_READ_BATCH_SIZE), columns.types,
+        _block_shapes(columns.shapes))
+    return dataset.apply(tf.data.experimental.unbatch())
+
+
+def _unpad(*args):
+    if len(args) == 1:
+        return unpad_hits(**args[0])
+    return unpad_hits(*args)
+
+
+def bucketed_dataset(columns,
+                     batch_size,
+                     is_shuffle,
+                     padding_size,
+                     boundaries=None,
+                     nb_epochs=None):
+    """
+    Batches of photons of `columns` (hits, first_hit_index and padded_size,
+    padded to `padding_size` hits) bucketed by `boundaries` (default
+    `default_bucket_boundaries`), see `bucket_labels`.
+    """
+    if boundaries is None:
+        boundaries = default_bucket_boundaries(padding_size)
+    dataset = _to_dataset(columns).map(_unpad).repeat(nb_epochs)
+    if is_shuffle:
+        dataset = dataset.shuffle(batch_size * 4)
+    dataset = BucketByLength(get_nb_true_hits, boundaries, batch_size)(dataset)
+    return dataset.map(bucket_labels).prefetch(AUTOTUNE)
@@ -8,8 +8,10 @@ from dxl.data.function import (Filter, GetAttr, MapByPosition,
                                Padding, Swap, To, append, function, shape_list, Function)
 from dxl.learn.core import Tensor
 from dxl.learn.dataset import DatasetFromColumnsV2, Train80Partitioner
+from dxl.learn.dataset.dataset import dataset_to_tensor
 from dxl.learn.function import OneHot
 
+from .bucketing import bucketed_dataset, default_bucket_boundaries
 from dxl.data.zoo.incident import (
     load_table, Photon, Coincidence, PhotonColumns, CoincidenceColumns)
 
@@ -87,6 +89,27 @@ def post_processing(dataset, padding_size):
     return DatasetIncidentSingle(hits, label, dataset.tensors['padded_size'])
 
 
+@function
+def bucketed_post_processing(tensors):
+    return DatasetIncidentSingle(Tensor(tensors['hits']),
+                                 Tensor(tensors['first_hit_index']),
+                                 Tensor(tensors['padded_size']))
+
+
+@function
+def dataset_bucketed(columns, batch_size, is_shuffle, padding_size,
+                     boundaries=None, nb_epochs=None):
+    """
+    Photons of `columns` (padded to `padding_size` hits) are batched by
+    number of true hits, each batch is padded to its bucket of `boundaries`
+    (default `default_bucket_boundaries`) instead of `padding_size`, thus
+    shape of hits is [batch_size, None, 4], see `bucketing.bucketed_dataset`.
+    """
+    dataset = bucketed_dataset(columns, batch_size, is_shuffle, padding_size,
+                               boundaries, nb_epochs)
+    return bucketed_post_processing(dataset_to_tensor(dataset))
+
+
 @function
 def photon_pytable(path_table, batch_size, is_shuffle, nb_hits, is_train=None):
     photons = load_table(path_table)
@@ -135,7 +158,7 @@ def dataset_fast(path_table, batch_size, is_shuffle, nb_hits, is_train):
 
 
 __all__ = ['dataset_db', 'dataset_pytable',
-           'DatasetIncidentSingle', 'dataset_fast']
+           'DatasetIncidentSingle', 'dataset_fast', 'dataset_bucketed']
 # if __name__ == "__main__":
 #     padding_size = 10
 #     batch_size = 32
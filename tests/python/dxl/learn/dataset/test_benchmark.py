@@ -0,0 +1,37 @@
+import tempfile
+import unittest
+
+import numpy as np
+
+from dxl.learn.dataset.benchmark import (FIXTURES, make_fixtures, open_fixture,
+                                         summarize, time_python)
+
+
+class TestBenchmark(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.paths = make_fixtures(self.tmp.name, nb_samples=100, shape=(4, 4))
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def test_fixtures(self):
+        for name in FIXTURES:
+            columns = open_fixture(name, self.paths[name])
+            assert columns.capacity == 100
+            if hasattr(columns, 'close'):
+                columns.close()
+
+    def test_time_python(self):
+        columns = open_fixture('hdf5', self.paths['hdf5'])
+        result = time_python(lambda: iter(columns.iter_batches(32)), 10)
+        columns.close()
+        assert result['nb_samples'] > 0
+        assert set(result['latency_ms']) == {'p50', 'p90', 'p99', 'max'}
+
+
+def test_summarize():
+    result = summarize([0.001, 0.003], 10)
+    assert result['nb_samples'] == 10
+    np.testing.assert_allclose(result['samples_per_second'], 2500)
+    np.testing.assert_allclose(result['latency_ms']['max'], 3)
@@ -0,0 +1,54 @@
+from dxl.learn.dataset.chunk_cache import ChunkCache, ChunkedReader
+from dxl.learn.dataset.data_column import HDF5DataColumns
+import numpy as np
+import h5py
+import tempfile
+import unittest
+from pathlib import Path
+
+
+class TestChunkCache(unittest.TestCase):
+    def test_lru_eviction(self):
+        c = ChunkCache(max_bytes=16)
+        c.put('a', np.zeros([1], np.float64))
+        c.put('b', np.zeros([1], np.float64))
+        assert c.get('a') is not None
+        c.put('c', np.zeros([1], np.float64))
+        assert c.get('b') is None
+        assert c.nb_bytes == 16
+        assert c.stats()['hits'] == 1
+        assert c.stats()['misses'] == 1
+
+
+class TestChunkedReader(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.path = Path(self.tmp.name) / 'data.h5'
+        self.x = np.arange(40, dtype=np.float32).reshape([20, 2])
+        with h5py.File(str(self.path), 'w') as fout:
+            fout.create_dataset('x', data=self.x, chunks=(4, 2),
+                                compression='gzip')
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def test_read_each_chunk_once(self):
+        cache = ChunkCache()
+        with h5py.File(str(self.path), 'r') as fin:
+            r = ChunkedReader(fin['x'], cache)
+            indices = [13, 1, 2, 14, 0, 19]
+            np.testing.assert_array_equal(r.read(indices), self.x[indices])
+        assert cache.misses == 3
+        assert cache.hits == 0
+        assert len(cache) == 3
+
+    def test_columns_with_chunk_cache(self):
+        cache = ChunkCache()
+        c = HDF5DataColumns(self.path, chunk_cache=cache)
+        try:
+            np.testing.assert_array_equal(c[5]['x'], self.x[5])
+            np.testing.assert_array_equal(c.get_batch([6, 4])['x'],
+                                          self.x[[6, 4]])
+            assert cache.hits == 1
+        finally:
+            c.close()
@@ -1,9 +1,14 @@
 from dxl.learn.dataset import ListColumns, PyTablesColumns, DataColumns, RangeColumns, DataColumnsPartition, Train80Partitioner
+from dxl.learn.dataset.data_column import NDArrayColumns, NPYDataColumns, NPZDataColumns, CachedColumns, JointDataColumns
 from dxl.learn.test import TestCase
+import numpy as np
 
 import unittest
+import pytest
+import tempfile
 from pathlib import Path
 from contextlib import contextmanager
+import tables as tb
 
 
 class TestListColumns(unittest.TestCase):
@@ -26,6 +31,121 @@ class TestRangeColumns(unittest.TestCase):
         samples = [s for s in c]
         assert samples == list(range(nb_samples))
 
+    def test_get_batch(self):
+        c = RangeColumns(10)
+        assert list(c.get_batch(slice(3, 6))) == [3, 4, 5]
+
+
+class TestNDArrayColumns(unittest.TestCase):
+    def get_columns(self, nb_samples=10):
+        x = np.arange(nb_samples * 2).reshape([nb_samples, 2])
+        y = np.arange(nb_samples)
+        return NDArrayColumns({'x': x, 'y': y})
+
+    def test_get_batch_slice(self):
+        c = self.get_columns()
+        b = c.get_batch(slice(2, 5))
+        assert b['x'].shape == (3, 2)
+        assert list(b['y']) == [2, 3, 4]
+
+    def test_get_batch_unsorted_duplicated(self):
+        c = self.get_columns()
+        b = c.get_batch([7, 1, 7, 3])
+        assert list(b['y']) == [7, 1, 7, 3]
+        assert list(b['x'][1]) == [2, 3]
+
+    def test_iter_batches(self):
+        c = self.get_columns()
+        batches = list(c.iter_batches(4))
+        assert [len(b['y']) for b in batches] == [4, 4, 2]
+        batches = list(c.iter_batches(4, drop_remainder=True))
+        assert [len(b['y']) for b in batches] == [4, 4]
+
+
+class TestJointDataColumns(unittest.TestCase):
+    def get_columns(self):
+        phantom = NDArrayColumns({'phantom': np.arange(10), 'id': np.arange(10)})
+        sinogram = NDArrayColumns({'sinogram': np.arange(10) * 2})
+        return JointDataColumns([phantom, sinogram],
+                                [{'phantom': 'label'}, {'sinogram': 'input'}])
+
+    def test_columns(self):
+        c = self.get_columns()
+        assert c.columns == ('label', 'input')
+        assert c.capacity == 10
+        assert c.shapes == {'label': (), 'input': ()}
+
+    def test_sample(self):
+        c = self.get_columns()
+        assert c[3] == {'label': 3, 'input': 6}
+
+    def test_get_batch(self):
+        c = self.get_columns()
+        b = c.get_batch([4, 1])
+        assert list(b['label']) == [4, 1]
+        assert list(b['input']) == [8, 2]
+
+    def test_inconsistant_capacity(self):
+        c = JointDataColumns([RangeColumns(3), RangeColumns(4)], [{}, {}])
+        with pytest.raises(ValueError):
+            c.capacity
+
+
+class TestMemoryMappedColumns(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.x = np.arange(20, dtype=np.float32).reshape([10, 2])
+        self.y = np.arange(10, dtype=np.int64)
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def test_npy_mmap(self):
+        path = Path(self.tmp.name) / 'x.npy'
+        np.save(str(path), self.x)
+        c = NPYDataColumns(path, mmap_mode='r')
+        assert isinstance(c.data[c.K.DATA], np.memmap)
+        assert c.capacity == 10
+        np.testing.assert_array_equal(c[3][c.K.DATA], self.x[3])
+
+    def test_npz_mmap(self):
+        path = Path(self.tmp.name) / 'xy.npz'
+        np.savez(str(path), x=self.x, y=self.y)
+        c = NPZDataColumns(path, mmap_mode='r')
+        assert isinstance(c.data['x'], np.memmap)
+        np.testing.assert_array_equal(c.data['x'], self.x)
+        np.testing.assert_array_equal(c.get_batch([4, 2])['y'], [4, 2])
+
+    def test_npz_mmap_compressed_fallback(self):
+        path = Path(self.tmp.name) / 'xy.npz'
+        np.savez_compressed(str(path), x=self.x, y=self.y)
+        c = NPZDataColumns(path, mmap_mode='r')
+        np.testing.assert_array_equal(c.data['y'], self.y)
+
+
+class TestMaterialize(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def test_materialize_dict(self):
+        x = np.arange(20, dtype=np.float32).reshape([10, 2])
+        c = NDArrayColumns({'train/x': x, 'y': np.arange(10)})
+        cached = c.materialize(Path(self.tmp.name) / 'cache', batch_size=3)
+        assert isinstance(cached.data['train/x'], np.memmap)
+        assert cached.capacity == 10
+        assert cached.shapes['train/x'] == (2, )
+        np.testing.assert_array_equal(cached[4]['train/x'], x[4])
+        reopened = CachedColumns(Path(self.tmp.name) / 'cache')
+        np.testing.assert_array_equal(reopened.data['y'], np.arange(10))
+
+    def test_materialize_partition(self):
+        c = DataColumnsPartition(RangeColumns(10), Train80Partitioner(True))
+        cached = c.materialize(Path(self.tmp.name) / 'cache')
+        assert list(cached.data[CachedColumns.K.DATA]) == list(range(8))
+
 
 class TestPyTablesColumns(unittest.TestCase):
     @contextmanager
@@ -52,6 +172,59 @@ class TestPyTablesColumns(unittest.TestCase):
             assert tuple(c[0]['label'].shape) == tuple()
 
 
+class TestPyTablesColumnsBlockRead(unittest.TestCase):
+    class Row(tb.IsDescription):
+        image = tb.Float32Col(shape=(2, 2))
+        label = tb.Int32Col()
+
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.path = Path(self.tmp.name) / 'table.h5'
+        with tb.open_file(str(self.path), 'w') as fout:
+            t = fout.create_table(fout.root, 'train', self.Row)
+            for i in range(10):
+                t.row['image'] = np.full([2, 2], i, np.float32)
+                t.row['label'] = i
+                t.row.append()
+            t.flush()
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    @contextmanager
+    def get_columns(self, columns=None):
+        c = PyTablesColumns(self.path, '/train', columns)
+        try:
+            yield c
+        finally:
+            c.close()
+
+    def test_projection(self):
+        with self.get_columns('label') as c:
+            assert c.columns == ('label', )
+            assert set(c.shapes.keys()) == {'label'}
+            assert c[3] == {'label': 3}
+
+    def test_unknown_column(self):
+        with pytest.raises(ValueError):
+            PyTablesColumns(self.path, '/train', ['unknown'])
+
+    def test_get_batch_slice(self):
+        with self.get_columns() as c:
+            b = c.get_batch(slice(2, 5))
+            assert b['image'].shape == (3, 2, 2)
+            assert list(b['label']) == [2, 3, 4]
+
+    def test_get_batch_coordinates(self):
+        with self.get_columns(['label']) as c:
+            b = c.get_batch([8, 1, 5])
+            assert list(b['label']) == [8, 1, 5]
+
+    def test_block_size(self):
+        with self.get_columns() as c:
+            assert c.block_size == c._node.chunkshape[0]
+
+
 class TestDataColumnsIterator(unittest.TestCase):
     def test_next(self):
         nb_samples = 10
@@ -86,3 +259,8 @@ class TestDataColumnsPartition(unittest.TestCase):
         c = self.get_columns()
         samples = [s for s in c]
         assert samples == list(range(8))
+
+    def test_iter_batches(self):
+        c = self.get_columns()
+        batches = [list(b) for b in c.iter_batches(3)]
+        assert batches == [[0, 1, 2], [3, 4, 5], [6, 7]]
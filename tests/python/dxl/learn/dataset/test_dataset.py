@@ -1,5 +1,10 @@
 # from dxl.learn.dataset import DatasetFromColumns, RangeColumns, Train80Partitioner, DataColumnsPartition, DatasetFromColumnsV2
-from dxl.learn.dataset import RangeColumns, Train80Partitioner, DataColumnsPartition
+from dxl.learn.dataset import RangeColumns, Train80Partitioner, DataColumnsPartition, ShufflePartitioner
+from dxl.learn.dataset.dataset import DatasetFromColumns, choose_pipeline, PIPELINE
+from dxl.learn.dataset.dataset import Map, MapBatched, Interleave, Prefetch, StandardProcessing, Cache, BucketByLength
+import os
+import tempfile
+import tensorflow as tf
 from dxl.learn.test import TestCase
 import pytest
 import numpy as np
@@ -40,6 +45,31 @@ class TestDatasetFromColumns(TestCase):
                 expected[i, j] = i * 32 + j
         self.assertFloatArrayEqual(expected, samples, 'samples not equal')
 
+    def test_pipeline_tensor_slices(self):
+        d = DatasetFromColumns(
+            'dataset_in_memory',
+            DataColumnsPartition(RangeColumns(100), Train80Partitioner(True)),
+            nb_epochs=1,
+            batch_size=32,
+            memory_budget=2**20)
+        d.make()
+        assert d.pipeline == PIPELINE.TENSOR_SLICES
+        with self.test_session() as sess:
+            samples = sess.run(d.tensors[d.KEYS.TENSOR.DATA])
+        self.assertFloatArrayEqual(np.arange(32), samples, 'samples not equal')
+
+    def test_pipeline_batched(self):
+        d = DatasetFromColumns(
+            'dataset_batched',
+            DataColumnsPartition(RangeColumns(100), Train80Partitioner(True)),
+            nb_epochs=1,
+            batch_size=32)
+        d.make()
+        assert d.pipeline == PIPELINE.BATCHED
+        with self.test_session() as sess:
+            samples = sess.run(d.tensors[d.KEYS.TENSOR.DATA])
+        self.assertFloatArrayEqual(np.arange(32), samples, 'samples not equal')
+
     @pytest.mark.skip(reason='not fix yet')
     def test_incident_gamma(self):
         from dxl.data.zoo.incident_position_estimation.data import padded_hits_columns, Hit, just_add_index
@@ -48,3 +78,165 @@ class TestDatasetFromColumns(TestCase):
         dataset = DatasetFromColumnsV2(
             'dataset', columns, batch_size=32, is_shuffle=True)
         dataset.make()
+
+
+def test_choose_pipeline():
+    columns = DataColumnsPartition(RangeColumns(100), Train80Partitioner(True))
+    assert choose_pipeline(columns) == PIPELINE.BATCHED
+    assert choose_pipeline(columns, 2**20) == PIPELINE.TENSOR_SLICES
+    assert choose_pipeline(columns, 100) == PIPELINE.BATCHED
+    shuffled = DataColumnsPartition(RangeColumns(100), ShufflePartitioner())
+    assert choose_pipeline(shuffled, 2**20) == PIPELINE.BATCHED
+
+
+class TestParallelStages(TestCase):
+    def run_all(self, dataset):
+        x = dataset.make_one_shot_iterator().get_next()
+        result = []
+        with self.test_session() as sess:
+            try:
+                while True:
+                    result.append(sess.run(x).tolist())
+            except tf.errors.OutOfRangeError:
+                pass
+        return result
+
+    def test_map(self):
+        d = Map(lambda x: x * 2)(tf.data.Dataset.range(4))
+        assert self.run_all(d) == [0, 2, 4, 6]
+
+    def test_map_batched(self):
+        d = MapBatched(lambda x: x + 1, 3)(tf.data.Dataset.range(4))
+        assert self.run_all(d) == [[1, 2, 3], [4]]
+
+    def test_interleave(self):
+        d = Interleave(lambda x: tf.data.Dataset.from_tensors(x).repeat(2),
+                       2)(tf.data.Dataset.range(2))
+        assert self.run_all(d) == [0, 1, 0, 1]
+
+    def test_standard_processing_with_map_and_prefetch(self):
+        f = StandardProcessing(2, 1, False, processing=lambda x: x * 10)
+        d = Prefetch(1)(f(tf.data.Dataset.range(4)))
+        assert self.run_all(d) == [[0, 10], [20, 30]]
+
+    def test_bucket_by_length(self):
+        lengths = [1, 3, 2, 7, 5, 8, 1, 2]
+        d = tf.data.Dataset.from_generator(
+            lambda: (np.full([n], n, np.int64) for n in lengths), tf.int64,
+            tf.TensorShape([None]))
+        d = BucketByLength(lambda x: tf.shape(x)[0], [3, 5, 9], 2)(d)
+        batches = [np.array(b) for b in self.run_all(d)]
+        assert sorted(b.shape[1] for b in batches) == [2, 2, 4, 8, 8]
+        for b in batches:
+            assert np.all(b.max(axis=1) < [3, 5, 9][[2, 4, 8].index(b.shape[1])])
+        assert sum(np.count_nonzero(b) for b in batches) == sum(lengths)
+
+    def test_bucket_by_length_batch_sizes(self):
+        with pytest.raises(ValueError):
+            BucketByLength(lambda x: tf.shape(x)[0], [3, 5], [2, 2])
+
+
+class TestCache(TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.source = os.path.join(self.tmp.name, 'source.npy')
+        np.save(self.source, np.arange(5))
+        self.cache_dir = os.path.join(self.tmp.name, 'cache')
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def test_key_changes(self):
+        c = Cache(self.cache_dir, 'd', source=self.source, config={'a': 1})
+        path = c.path()
+        assert Cache(self.cache_dir, 'd', source=self.source,
+                     config={'a': 2}).path() != path
+        st = os.stat(self.source)
+        os.utime(self.source, ns=(st.st_atime_ns, st.st_mtime_ns + 10**9))
+        assert c.path() != path
+
+    def test_replay_and_remove_stale(self):
+        for config in [1, 1, 2]:
+            d = Cache(self.cache_dir, 'd', source=self.source,
+                      config=config)(tf.data.Dataset.range(3))
+            x = d.make_one_shot_iterator().get_next()
+            with self.test_session() as sess:
+                assert [sess.run(x) for _ in range(3)] == [0, 1, 2]
+        digests = {f.split('.')[1] for f in os.listdir(self.cache_dir)}
+        assert len(digests) == 1
+
+    def test_keep_caches_of_other_sources(self):
+        other = os.path.join(self.tmp.name, 'other.npy')
+        np.save(other, np.arange(3))
+        for source in [self.source, other]:
+            d = Cache(self.cache_dir, 'd', source=source)(
+                tf.data.Dataset.range(3))
+            x = d.make_one_shot_iterator().get_next()
+            with self.test_session() as sess:
+                sess.run(x)
+        digests = {f.split('.')[1] for f in os.listdir(self.cache_dir)}
+        assert len(digests) == 2
+
+    def test_keep_locked_cache(self):
+        os.makedirs(self.cache_dir)
+        locked = Cache(self.cache_dir, 'd', source=self.source, config=1)
+        locked._write_source(locked.path())
+        open(locked.path() + Cache.LOCK_SUFFIX, 'w').close()
+        Cache(self.cache_dir, 'd', source=self.source,
+              config=2)(tf.data.Dataset.range(3))
+        assert os.path.exists(locked.path() + Cache.LOCK_SUFFIX)
+        assert os.path.exists(locked.path() + Cache.SOURCE_SUFFIX)
+
+
+class TestResumable(TestCase):
+    def run_batches(self, nb_batches, path_save=None, path_load=None):
+        from dxl.learn.dataset.resumable import initialize_resumable_datasets
+        with tf.Graph().as_default():
+            d = DatasetFromColumns(
+                'dataset_resumable',
+                RangeColumns(10),
+                batch_size=3,
+                is_shuffle=True,
+                is_resumable=True,
+                seed=7)
+            d.make()
+            x = d.tensors[d.KEYS.TENSOR.DATA]
+            saver = tf.train.Saver()
+            with tf.Session() as sess:
+                sess.run(tf.global_variables_initializer())
+                if path_load is not None:
+                    saver.restore(sess, path_load)
+                initialize_resumable_datasets(sess)
+                result = [sess.run(x) for _ in range(nb_batches)]
+                if path_save is not None:
+                    saver.save(sess, path_save)
+                return np.concatenate(result), sess.run(d.state.position)
+
+    def test_resume_from_checkpoint(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            path = os.path.join(tmp, 'model')
+            expected, _ = self.run_batches(8)
+            first, position = self.run_batches(3, path_save=path)
+            assert position == 9
+            rest, position = self.run_batches(5, path_load=path)
+            assert position == 24
+        self.assertFloatArrayEqual(expected, np.concatenate([first, rest]))
+
+    def test_state_scoped_by_dataset(self):
+        with tf.Graph().as_default():
+            datasets = [
+                DatasetFromColumns(
+                    name, RangeColumns(10), batch_size=3, is_resumable=True)
+                for name in ('train', 'test')
+            ]
+            for d in datasets:
+                d.make()
+            names = [d.state.position.op.name for d in datasets]
+        assert names == ['train/iterator_state/position',
+                         'test/iterator_state/position']
+
+    def test_shuffled_epochs(self):
+        samples, _ = self.run_batches(8)
+        assert sorted(samples[:10]) == list(range(10))
+        assert list(samples[:10]) != list(range(10))
+        assert list(samples[10:20]) != list(samples[:10])
@@ -0,0 +1,120 @@
+from dxl.learn.dataset.file_pool import FileHandlePool, BACKEND
+from dxl.learn.dataset.data_column import (HDF5DataColumns, PyTablesColumns,
+                                           PytableReader)
+import multiprocessing as mp
+import numpy as np
+import h5py
+import tables as tb
+import tempfile
+import unittest
+from pathlib import Path
+
+
+def _read_in_child(columns, queue):
+    queue.put(columns.get_batch([1, 3])['x'].tolist())
+
+
+class TestFileHandlePool(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.paths = []
+        for i in range(3):
+            path = str(Path(self.tmp.name) / 'data.{}.h5'.format(i))
+            with h5py.File(path, 'w') as fout:
+                fout.create_dataset('x', data=np.arange(4) + i)
+            self.paths.append(path)
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def test_shared_and_reference_counted(self):
+        pool = FileHandlePool()
+        a, b = pool.open(self.paths[0]), pool.open(self.paths[0])
+        assert a.file is b.file
+        a.close()
+        assert b.file['x'][0] == 0
+        assert pool.stats() == {
+            'nb_open': 1, 'nb_in_use': 1, 'nb_opened': 1, 'nb_reused': 1}
+        f = b.file
+        b.close()
+        assert pool.stats()['nb_in_use'] == 0
+        assert pool.stats()['nb_open'] == 0
+        assert not f
+
+    def test_write_after_close(self):
+        columns = HDF5DataColumns(self.paths[0])
+        assert columns.get_batch([1])['x'].tolist() == [1]
+        columns.close()
+        with h5py.File(self.paths[0], 'w') as fout:
+            fout.create_dataset('x', data=np.arange(2))
+
+    def test_close_least_recently_used_idle(self):
+        pool = FileHandlePool(max_open=2, keep_alive=True)
+        leases = [pool.open(p) for p in self.paths]
+        assert pool.stats()['nb_open'] == 3
+        f0 = leases[0].file
+        for l in leases:
+            l.close()
+        assert pool.stats()['nb_open'] == 2
+        assert not f0
+        assert pool.open(self.paths[2]).file
+        assert pool.stats()['nb_opened'] == 3
+
+    def test_reopen_changed_file(self):
+        pool = FileHandlePool(keep_alive=True)
+        pool.open(self.paths[0]).close()
+        pool.clear()
+        with h5py.File(self.paths[0], 'w') as fout:
+            fout.create_dataset('x', data=np.arange(8))
+        with pool.open(self.paths[0]) as l:
+            assert l.file['x'].shape == (8, )
+
+    def test_reopen_after_fork(self):
+        columns = HDF5DataColumns(self.paths[1], pool=FileHandlePool())
+        queue = mp.get_context('fork').Queue()
+        p = mp.get_context('fork').Process(
+            target=_read_in_child, args=(columns, queue))
+        p.start()
+        assert queue.get(timeout=30) == [2, 4]
+        p.join()
+        assert columns.get_batch([0])['x'].tolist() == [1]
+        columns.close()
+
+
+class TestColumnsWithPool(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.path = str(Path(self.tmp.name) / 'table.h5')
+
+        class Row(tb.IsDescription):
+            x = tb.Int64Col()
+
+        with tb.open_file(self.path, 'w') as fout:
+            t = fout.create_table(fout.root, 'data', Row)
+            t.append(np.array([(i, ) for i in range(5)], dtype=t.dtype))
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def test_pytables_columns_share_file(self):
+        pool = FileHandlePool()
+        a = PyTablesColumns(self.path, '/data', pool=pool)
+        b = PyTablesColumns(self.path, '/data', pool=pool)
+        assert a._file is b._file
+        a.close()
+        assert b.get_batch([4])['x'].tolist() == [4]
+        b.close()
+        assert pool.stats()['nb_in_use'] == 0
+
+    def test_append_after_close(self):
+        c = PyTablesColumns(self.path, '/data')
+        assert c.get_batch([2])['x'].tolist() == [2]
+        c.close()
+        with tb.open_file(self.path, 'a') as fout:
+            fout.root.data.append(np.array([(5, )], dtype=fout.root.data.dtype))
+
+    def test_pytable_reader_defaults_not_shared(self):
+        with PytableReader(self.path) as a, PytableReader(self.path) as b:
+            a.get_h5_to_table('/data')
+            assert a.table is not b.table
+            assert b.table == {}
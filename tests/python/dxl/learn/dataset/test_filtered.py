@@ -0,0 +1,65 @@
+from dxl.learn.dataset.filtered import FilteredColumns
+from dxl.learn.dataset.data_column import NDArrayColumns, HDF5DataColumns, PyTablesColumns
+import numpy as np
+import h5py
+import tables as tb
+import os
+import tempfile
+import unittest
+from pathlib import Path
+
+
+class TestFilteredColumns(unittest.TestCase):
+    class Photon(tb.IsDescription):
+        hits = tb.Float32Col(shape=(3, ))
+        nb_true_hits = tb.Int32Col()
+
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.nb_hits = np.array([1, 2, 3, 2, 2, 1, 3, 2], np.int32)
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def test_in_memory(self):
+        c = NDArrayColumns({'nb_true_hits': self.nb_hits,
+                            'id': np.arange(8)})
+        f = FilteredColumns(c, 'nb_true_hits == n', condvars={'n': 2},
+                            block_size=3)
+        assert f.index_path is None
+        assert f.capacity == 4
+        assert list(f.get_batch(slice(0, 4))['id']) == [1, 3, 4, 7]
+        assert f[1]['id'] == 3
+
+    def test_pytables_where_and_persist(self):
+        path = Path(self.tmp.name) / 'photons.h5'
+        with tb.open_file(str(path), 'w') as fout:
+            t = fout.create_table(fout.root, 'photons', self.Photon)
+            t.append([(np.full([3], i, np.float32), n)
+                      for i, n in enumerate(self.nb_hits)])
+            t.flush()
+        c = PyTablesColumns(path, '/photons')
+        try:
+            f = FilteredColumns(c, 'nb_true_hits == n', condvars={'n': 3})
+            assert list(f.indices) == [2, 6]
+            assert os.path.exists(f.index_path)
+            np.save(f.index_path, np.array([0]))
+            f = FilteredColumns(c, 'nb_true_hits == n', condvars={'n': 3})
+            assert list(f.indices) == [0]
+            f = FilteredColumns(c, 'nb_true_hits == n', condvars={'n': 1})
+            assert list(f.indices) == [0, 5]
+        finally:
+            c.close()
+
+    def test_hdf5_mask(self):
+        path = Path(self.tmp.name) / 'photons.h5'
+        with h5py.File(str(path), 'w') as fout:
+            fout['nb_true_hits'] = self.nb_hits
+        c = HDF5DataColumns(path)
+        try:
+            f = FilteredColumns(c, 'nb_true_hits > 2',
+                                cache_dir=self.tmp.name)
+            assert list(f.indices) == [2, 6]
+            assert os.path.dirname(f.index_path) == self.tmp.name
+        finally:
+            c.close()
@@ -0,0 +1,51 @@
+from dxl.learn.dataset.parallel import ParallelColumnsIterator, ParallelColumns
+from dxl.learn.dataset.data_column import NPYDataColumns
+import numpy as np
+import functools
+import tempfile
+import unittest
+from pathlib import Path
+
+
+class TestParallelColumnsIterator(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.path = Path(self.tmp.name) / 'x.npy'
+        self.x = np.arange(200, dtype=np.float32).reshape([100, 2])
+        np.save(str(self.path), self.x)
+        self.factory = functools.partial(NPYDataColumns, self.path)
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def test_ordered(self):
+        it = ParallelColumnsIterator(self.factory, 100, 16, nb_workers=3,
+                                     copy=True)
+        batches = [b[NPYDataColumns.K.DATA] for b in it]
+        assert len(batches) == 7
+        np.testing.assert_array_equal(np.concatenate(batches), self.x)
+
+    def test_unordered_with_indices(self):
+        indices = np.random.permutation(100)
+        it = ParallelColumnsIterator(self.factory, indices, 10, nb_workers=2,
+                                     is_ordered=False, copy=True)
+        result = np.concatenate([b[NPYDataColumns.K.DATA] for b in it])
+        assert sorted(result[:, 0]) == sorted(self.x[:, 0])
+
+    def test_oversized_block_fallback(self):
+        it = ParallelColumnsIterator(self.factory, 20, 10, nb_workers=1,
+                                     slot_bytes=8)
+        result = np.concatenate([b[NPYDataColumns.K.DATA] for b in it])
+        np.testing.assert_array_equal(result, self.x[:20])
+
+    def test_parallel_columns_samples(self):
+        c = ParallelColumns(self.factory, block_size=32, nb_workers=2)
+        assert c.capacity == 100
+        samples = [s[NPYDataColumns.K.DATA] for s in c]
+        np.testing.assert_array_equal(np.array(samples), self.x)
+
+    def test_parallel_columns_batches_kept(self):
+        c = ParallelColumns(self.factory, block_size=8, nb_workers=1,
+                            max_in_flight=1)
+        batches = [b[NPYDataColumns.K.DATA] for b in c.iter_batches()]
+        np.testing.assert_array_equal(np.concatenate(batches), self.x)
@@ -1,7 +1,9 @@
-from dxl.learn.dataset.partitioner import Partitioner, CrossValidatePartitioner, Train80Partitioner
-from dxl.learn.dataset.data_column import DataColumns
+from dxl.learn.dataset.partitioner import Partitioner, CrossValidatePartitioner, Train80Partitioner, ShufflePartitioner, BlockShufflePartitioner, WorkerShardPartitioner, WeightedPartitioner, StratifiedCrossValidatePartitioner
+from dxl.learn.dataset.permutation import FeistelPermutation
+from dxl.learn.dataset.data_column import DataColumns, NDArrayColumns
 import unittest
 import pytest
+import numpy as np
 
 
 class PartitionerTestCase(unittest.TestCase):
@@ -41,6 +43,39 @@ class TestCrossValidatePartition(PartitionerTestCase):
         data = list(it)
         assert data == [4, 5, 6, 7]
 
+    def test_indices_contiguous_range(self):
+        p = CrossValidatePartitioner(10, [2, 3])
+        indices = p.indices(self.get_data_column(20))
+        assert indices == range(4, 8)
+
+    def test_indices_array(self):
+        p = CrossValidatePartitioner(10, [5, 1])
+        indices = p.indices(self.get_data_column(20))
+        assert isinstance(indices, np.ndarray)
+        assert list(indices) == [10, 11, 2, 3]
+        assert p.get_capacity(self.get_data_column(20)) == 4
+
+    def test_order_of_blocks(self):
+        p = CrossValidatePartitioner(5, [3, 1])
+        c = self.get_data_column(10)
+        assert list(p.indices(c)) == [6, 7, 2, 3]
+        assert list(p.take(c, np.arange(4))) == [6, 7, 2, 3]
+        assert list(CrossValidatePartitioner(5, [1, 2]).indices(c)) == [
+            2, 3, 4, 5]
+
+    def test_take(self):
+        p = CrossValidatePartitioner(10, [5, 1, 7])
+        c = self.get_data_column(23)
+        positions = np.array([5, 0, 3, 4], dtype=np.int64)
+        assert list(p.take(c, positions)) == list(
+            p.indices(c)[positions])
+
+    def test_partition_batches(self):
+        p = CrossValidatePartitioner(10, [1, 3])
+        batches = [list(b) for b in p.partition_batches(
+            self.get_data_column(20), 3)]
+        assert batches == [[2, 3, 6], [7]]
+
 
 class TestTrain80Partitioner(PartitionerTestCase):
     def test_train(self):
@@ -54,3 +89,182 @@ class TestTrain80Partitioner(PartitionerTestCase):
         it = Train80Partitioner(False).partition(
             self.get_data_column(nb_samples))
         assert list(it) == list(range(16, 20))
+
+
+class TestFeistelPermutation(unittest.TestCase):
+    def test_bijection(self):
+        for n in [1, 2, 3, 17, 1000, 4097]:
+            p = FeistelPermutation(n, seed=7)
+            assert sorted(p(np.arange(n)).tolist()) == list(range(n))
+
+    def test_random_access(self):
+        p = FeistelPermutation(1000, seed=3)
+        full = p(np.arange(1000))
+        assert p([10, 500])[1] == full[500]
+        with pytest.raises(IndexError):
+            p([1000])
+
+
+class TestShufflePartitioner(PartitionerTestCase):
+    def test_epochs_differ_and_reproducible(self):
+        c = self.get_data_column(100)
+        p = ShufflePartitioner(seed=1)
+        e0, e1 = list(p.partition(c)), list(p.partition(c))
+        assert sorted(e0) == sorted(e1) == list(range(100))
+        assert e0 != e1
+        assert p.epoch == 2
+        assert list(ShufflePartitioner(seed=1).partition(c)) == e0
+        assert p.index_at(c, 5, epoch=1) == e1[5]
+        assert p.indices(c, epoch=0)[-1] == e0[-1]
+
+    def test_with_base_partitioner(self):
+        c = self.get_data_column(20)
+        p = ShufflePartitioner(seed=2, partitioner=CrossValidatePartitioner(
+            10, [1, 3]))
+        assert p.get_capacity(c) == 4
+        assert sorted(p.partition(c)) == [2, 3, 6, 7]
+
+    def test_partition_batches(self):
+        c = self.get_data_column(10)
+        p = ShufflePartitioner(seed=3)
+        expected = list(p.indices(c))
+        batches = [list(b) for b in p.partition_batches(c, 4)]
+        assert sum(batches, []) == expected
+        assert [len(b) for b in batches] == [4, 4, 2]
+
+
+class TestBlockShufflePartitioner(PartitionerTestCase):
+    def test_blocks_stay_in_windows(self):
+        c = self.get_data_column(100)
+        p = BlockShufflePartitioner(seed=1, block_size=10, window=2)
+        indices = list(p.partition(c))
+        assert sorted(indices) == list(range(100))
+        assert indices != list(range(100))
+        for w in range(5):
+            window = indices[w * 20:(w + 1) * 20]
+            assert len(set(i // 10 for i in window)) == 2
+
+    def test_epochs_and_base_partitioner(self):
+        c = self.get_data_column(40)
+        p = BlockShufflePartitioner(
+            seed=1, partitioner=Train80Partitioner(False), block_size=2)
+        assert p.get_capacity(c) == 8
+        e0, e1 = p.indices(c, 0), p.indices(c, 1)
+        assert sorted(e0) == sorted(e1) == list(range(32, 40))
+        assert list(e0) != list(e1)
+
+
+class TestWorkerShardPartitioner(PartitionerTestCase):
+    def shards(self, nb_samples, nb_workers, epoch=0, **kwargs):
+        c = self.get_data_column(nb_samples)
+        return [
+            list(WorkerShardPartitioner(
+                seed=5, nb_workers=nb_workers, task_index=t, **kwargs).indices(
+                    c, epoch)) for t in range(nb_workers)
+        ]
+
+    def test_disjoint_and_complete(self):
+        shards = self.shards(12, 3)
+        assert [len(s) for s in shards] == [4, 4, 4]
+        assert sorted(sum(shards, [])) == list(range(12))
+
+    def test_reshuffled_each_epoch(self):
+        assert self.shards(12, 3, 0) != self.shards(12, 3, 1)
+
+    def test_remainder_pad(self):
+        shards = self.shards(10, 3)
+        assert [len(s) for s in shards] == [4, 4, 4]
+        assert set(sum(shards, [])) == set(range(10))
+
+    def test_remainder_drop(self):
+        shards = self.shards(10, 3, remainder='drop')
+        assert [len(s) for s in shards] == [3, 3, 3]
+        assert len(set(sum(shards, []))) == 9
+
+    def test_capacity(self):
+        p = WorkerShardPartitioner(nb_workers=3, task_index=1)
+        assert p.get_capacity(self.get_data_column(10)) == 4
+        assert len(list(p.partition(self.get_data_column(10)))) == 4
+
+
+class TestWeightedPartitioner(PartitionerTestCase):
+    def test_zero_weights_never_drawn(self):
+        c = self.get_data_column(10)
+        weights = np.array([0, 1] * 5, np.float64)
+        p = WeightedPartitioner(weights, 1000, seed=1)
+        indices = p.indices(c)
+        assert len(indices) == 1000
+        assert set(indices.tolist()) == {1, 3, 5, 7, 9}
+        assert not np.array_equal(p.indices(c, 1), indices)
+
+    def test_balanced(self):
+        c = self.get_data_column(100)
+        labels = np.array([0] * 90 + [1] * 10)
+        p = WeightedPartitioner.balanced(labels, 20000, seed=2)
+        ratio = np.mean(labels[p.indices(c)])
+        assert 0.45 < ratio < 0.55
+
+    def test_with_base_partitioner(self):
+        c = self.get_data_column(20)
+        p = WeightedPartitioner(np.ones(20), partitioner=Train80Partitioner(False))
+        assert p.get_capacity(c) == 4
+        assert set(p.indices(c).tolist()) <= {16, 17, 18, 19}
+
+
+class TestStratifiedCrossValidatePartitioner(PartitionerTestCase):
+    def test_folds_keep_ratio(self):
+        c = self.get_data_column(20)
+        labels = np.array([0] * 15 + [1] * 5)
+        p = StratifiedCrossValidatePartitioner(labels, 5, [0])
+        assert list(p.indices(c)) == [0, 1, 2, 15]
+        q = StratifiedCrossValidatePartitioner(labels, 5, range(1, 5))
+        assert sorted(list(p.indices(c)) + list(q.indices(c))) == list(range(20))
+
+    def test_capacity(self):
+        c = self.get_data_column(20)
+        p = StratifiedCrossValidatePartitioner(lambda c: np.arange(20) % 2, 10, [1, 2])
+        assert p.get_capacity(c) == 4
+
+    def test_label_column_read_alone(self):
+        class Columns(NDArrayColumns):
+            def get_batch(self, indices):
+                raise AssertionError('whole samples are read')
+
+        labels = np.array([0] * 15 + [1] * 5)
+        p = StratifiedCrossValidatePartitioner('y', 5, [0])
+        c = Columns({'x': np.zeros([20, 64]), 'y': labels})
+        assert list(p.indices(c)) == [0, 1, 2, 15]
+        c = Columns({'x': np.zeros([10, 64]), 'y': labels[10:]})
+        assert list(p.indices(c)) == [0, 5]
+
+
+class TestPartitionerKey(PartitionerTestCase):
+    def make(self):
+        base = Train80Partitioner(True)
+        return [
+            base,
+            ShufflePartitioner(3, base),
+            BlockShufflePartitioner(3, base, block_size=8),
+            WorkerShardPartitioner(3, base, nb_workers=2, task_index=1),
+            WeightedPartitioner(np.ones([20]), 10, 3, base),
+            WeightedPartitioner.balanced('y', seed=3),
+            StratifiedCrossValidatePartitioner(np.arange(20) % 2, 5, [0]),
+        ]
+
+    def test_deterministic(self):
+        c = self.get_data_column(20)
+        a, b = self.make(), self.make()
+        for p in a:
+            if hasattr(p, 'set_epoch'):
+                p.set_epoch(5)
+            if not isinstance(p, WeightedPartitioner) or p._labels is None:
+                p.indices(c)
+        assert [p.key() for p in a] == [p.key() for p in b]
+        assert 'object at' not in repr([p.key() for p in a])
+
+    def test_configuration_differs(self):
+        assert (ShufflePartitioner(1).key() != ShufflePartitioner(2).key())
+        assert (Train80Partitioner(True).key() !=
+                Train80Partitioner(False).key())
+        assert (WeightedPartitioner(np.ones([4])).key() !=
+                WeightedPartitioner(np.arange(4)).key())
@@ -0,0 +1,113 @@
+from dxl.learn.dataset.preprocess import (preprocess, load_preprocessed,
+                                          stat_family)
+import multiprocessing as mp
+import numpy as np
+import tables as tb
+import tempfile
+import unittest
+from pathlib import Path
+
+
+def _normalize(sample):
+    result = dict(sample)
+    for k in ('sinogram', 'phantom'):
+        v = sample[k].T.astype(np.float32)
+        result[k] = v / np.sum(v) * 1e3
+    return result
+
+
+class TestPreprocess(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.sources = [
+            str(Path(self.tmp.name) / 'sino.h5'),
+            str(Path(self.tmp.name) / 'recon.h5')
+        ]
+        rng = np.random.RandomState(0)
+        self.sinogram = rng.randint(1, 100, [10, 4, 3]).astype(np.uint16)
+        self.phantom = rng.randint(1, 100, [12, 2, 2]).astype(np.uint16)
+
+        class Sino(tb.IsDescription):
+            sinogram = tb.UInt16Col(shape=(4, 3))
+
+        class Recon(tb.IsDescription):
+            phantom = tb.UInt16Col(shape=(2, 2))
+
+        for path, desc, k, v in zip(self.sources, (Sino, Recon),
+                                    ('sinogram', 'phantom'),
+                                    (self.sinogram, self.phantom)):
+            with tb.open_file(path, 'w') as fout:
+                t = fout.create_table(fout.root, 'data', desc)
+                rows = np.zeros(len(v), dtype=t.dtype)
+                rows[k] = v
+                t.append(rows)
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def run_preprocess(self, **kwargs):
+        output = str(Path(self.tmp.name) / 'output')
+        statistics = preprocess(
+            self.sources, ['sinogram', 'phantom', 'id'], output, _normalize,
+            shard_size=4, block_size=3, nb_workers=2,
+            mp_context=mp.get_context('fork'),
+            **kwargs)
+        return output, statistics
+
+    def test_shards_and_statistics(self):
+        output, statistics = self.run_preprocess()
+        assert statistics['shards'] == ['data.0.h5', 'data.1.h5', 'data.2.h5']
+        assert statistics['capacities'] == [4, 4, 2]
+        expected = [
+            _normalize({'sinogram': s, 'phantom': p, 'id': i})
+            for i, (s, p) in enumerate(zip(self.sinogram, self.phantom))
+        ]
+        columns, loaded = load_preprocessed(output)
+        assert loaded == statistics
+        batch = columns.get_batch([9, 0, 5])
+        for j, i in enumerate([9, 0, 5]):
+            np.testing.assert_allclose(batch['sinogram'][j],
+                                       expected[i]['sinogram'], rtol=1e-6)
+            assert batch['id'][j] == i
+        sino = np.stack([e['sinogram'] for e in expected])
+        np.testing.assert_allclose(statistics['SINO_STAT']['mean'],
+                                   np.mean(sino), rtol=1e-5)
+        np.testing.assert_allclose(statistics['SINO_STAT']['std'],
+                                   np.std(sino), rtol=1e-5)
+        phantom = np.stack([e['phantom'] for e in expected])
+        np.testing.assert_allclose(statistics['RECON_STAT']['std'],
+                                   np.std(phantom), rtol=1e-5)
+        assert 'id' not in statistics['fields']
+        assert 'ID_STAT' not in statistics
+        columns.close()
+
+    def test_stat_offsets(self):
+        _, plain = self.run_preprocess()
+        _, shifted = self.run_preprocess(stat_offsets={'SINO_STAT': 0.4})
+        assert shifted['stat_offsets'] == {'SINO_STAT': 0.4}
+        np.testing.assert_allclose(shifted['SINO_STAT']['mean'],
+                                   plain['SINO_STAT']['mean'] + 0.4)
+        np.testing.assert_allclose(shifted['fields']['sinogram']['mean'],
+                                   plain['fields']['sinogram']['mean'] + 0.4)
+        assert shifted['SINO_STAT']['std'] == plain['SINO_STAT']['std']
+        assert shifted['RECON_STAT'] == plain['RECON_STAT']
+
+    def test_default_context(self):
+        output = str(Path(self.tmp.name) / 'output')
+        statistics = preprocess(self.sources, ['sinogram'], output,
+                                shard_size=5, nb_workers=2)
+        assert statistics['capacities'] == [5, 5]
+
+    def test_stat_family(self):
+        assert stat_family('sinogram') == 'SINO_STAT'
+        assert stat_family('phantom') == stat_family('recon4x') == 'RECON_STAT'
+        assert stat_family('clean2x') == stat_family('noise2x')
+        assert stat_family('clean2x') != stat_family('clean4x')
+
+    def test_float16(self):
+        output, statistics = self.run_preprocess(dtype=np.float16)
+        columns, _ = load_preprocessed(output)
+        batch = columns.get_batch([1])
+        assert batch['sinogram'].dtype == np.float16
+        assert batch['id'].dtype == np.int64
+        columns.close()
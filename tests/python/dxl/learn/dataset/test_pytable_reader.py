@@ -121,3 +121,28 @@ class Test_PytableReader:
 			with tf.Session() as sess:
 				data = sess.run(data)
 				assert np.shape(data[0]) == (3,32,32,1)
+	def test_make_block_iterator(self):
+		file = self.create_test_file()
+		with PytableReader(file, table={}, file_dataset={}, block_size=4) as pr:
+			tb1 = pr.get_h5_to_table('/group1/train')
+			blocks = list(pr.make_block_iterator(tb1)())
+			assert [len(b[0]) for b in blocks] == [4, 4, 2]
+			assert blocks[0][0].shape == (4, 32, 32, 1)
+			assert (blocks[2][0][:, 0, 0, 0] == [9, 10]).all()
+	def test_make_iterator_multiple_passes(self):
+		file = self.create_test_file()
+		with PytableReader(file, table={}, file_dataset={}, block_size=3) as pr:
+			tb1 = pr.get_h5_to_table('/group1/train')
+			it = pr.make_iterator(tb1)
+			for _ in range(2):
+				assert [r[0][0, 0, 0] for r in it()] == list(range(1, 11))
+	def test_to_dataset_batched(self):
+		file = self.create_test_file()
+		with PytableReader(file, table={}, file_dataset={}, block_size=4) as pr:
+			pr.get_h5_to_table('/group1/train')
+			dt = pr.to_dataset('train', is_batched=True)
+			shapes = tf.compat.v1.data.get_output_shapes(dt)
+			assert shapes[0].as_list() == [None, 32, 32, 1]
+			with tf.Session() as sess:
+				a = sess.run(dt.make_one_shot_iterator().get_next())
+			assert a[0].shape == (4, 32, 32, 1)
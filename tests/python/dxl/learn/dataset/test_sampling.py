@@ -0,0 +1,41 @@
+import unittest
+
+import numpy as np
+import pytest
+
+from dxl.learn.dataset.sampling import AliasTable, inverse_frequency_weights
+
+
+class TestAliasTable(unittest.TestCase):
+    def test_probabilities_exact(self):
+        rng = np.random.RandomState(0)
+        for _ in range(100):
+            weights = rng.randint(0, 5, size=rng.randint(1, 20)).astype(float)
+            if weights.sum() == 0:
+                continue
+            table = AliasTable(weights)
+            np.testing.assert_allclose(table.probabilities(),
+                                       weights / weights.sum())
+
+    def test_skewed(self):
+        weights = np.concatenate([np.full(10000, 0.01), [1000.0]])
+        table = AliasTable(weights)
+        np.testing.assert_allclose(table.probabilities(),
+                                   weights / weights.sum(), atol=1e-12)
+
+    def test_sample(self):
+        table = AliasTable([1, 0, 3])
+        draws = table.sample(4000, np.random.RandomState(1))
+        assert 1 not in draws
+        assert 0.7 < np.mean(draws == 2) < 0.8
+
+    def test_invalid(self):
+        with pytest.raises(ValueError):
+            AliasTable([0, 0])
+        with pytest.raises(ValueError):
+            AliasTable([1, -1])
+
+
+def test_inverse_frequency_weights():
+    w = inverse_frequency_weights([3, 3, 3, 7])
+    np.testing.assert_allclose(w, [1 / 3, 1 / 3, 1 / 3, 1])
@@ -0,0 +1,73 @@
+from dxl.learn.dataset.schema import Schema, cached_schema, load_schema, schema_path
+from dxl.learn.dataset.data_column import HDF5DataColumns, PyTablesColumns
+import numpy as np
+import h5py
+import tables as tb
+import os
+import tempfile
+import unittest
+from pathlib import Path
+
+
+class TestCachedSchema(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.path = Path(self.tmp.name) / 'data.h5'
+        with h5py.File(str(self.path), 'w') as fout:
+            fout['x'] = np.zeros([10, 3], np.float32)
+            fout['y'] = np.zeros([10], np.int64)
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def make_schema(self):
+        self.nb_calls += 1
+        return Schema(10, {'x': np.float32}, {'x': (3, )})
+
+    def test_reuse(self):
+        self.nb_calls = 0
+        cached_schema(self.path, '/', self.make_schema)
+        s = cached_schema(self.path, '/', self.make_schema)
+        assert self.nb_calls == 1
+        assert s.capacity == 10
+        assert s.shapes['x'] == (3, )
+        assert s.dtypes['x'] == np.float32
+
+    def test_invalidate_on_change(self):
+        self.nb_calls = 0
+        cached_schema(self.path, '/', self.make_schema)
+        with h5py.File(str(self.path), 'a') as fout:
+            fout['z'] = np.zeros([10])
+        os.utime(str(self.path), ns=(0, 0))
+        assert load_schema(self.path, '/') is None
+
+    def test_hdf5_columns(self):
+        c = HDF5DataColumns(self.path)
+        try:
+            assert c.capacity == 10
+            assert c.shapes == {'x': (3, ), 'y': ()}
+        finally:
+            c.close()
+        assert os.path.exists(schema_path(self.path))
+        assert load_schema(self.path, '/').capacity == 10
+
+
+class TestPyTablesSchema(unittest.TestCase):
+    class Row(tb.IsDescription):
+        image = tb.Float32Col(shape=(2, 2))
+        label = tb.Int32Col()
+
+    def test_table_schema(self):
+        with tempfile.TemporaryDirectory() as d:
+            path = Path(d) / 'table.h5'
+            with tb.open_file(str(path), 'w') as fout:
+                t = fout.create_table(fout.root, 'train', self.Row)
+                t.append([(np.zeros([2, 2]), 1)] * 5)
+                t.flush()
+            c = PyTablesColumns(path, '/train')
+            try:
+                assert c.capacity == 5
+                assert c.shapes == {'image': (2, 2), 'label': ()}
+            finally:
+                c.close()
+            assert load_schema(path, '/train').capacity == 5
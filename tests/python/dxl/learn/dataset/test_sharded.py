@@ -0,0 +1,60 @@
+from dxl.learn.dataset.sharded import ShardedColumns
+from dxl.learn.dataset.data_column import NPYDataColumns
+import numpy as np
+import h5py
+import tempfile
+import unittest
+from pathlib import Path
+
+
+class TestShardedColumns(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.x = np.arange(25, dtype=np.float32)
+        self.paths = []
+        for i, (start, stop) in enumerate([(0, 10), (10, 13), (13, 25)]):
+            path = Path(self.tmp.name) / 'x.{}.h5'.format(i)
+            with h5py.File(str(path), 'w') as fout:
+                fout['x'] = self.x[start:stop]
+            self.paths.append(path)
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def test_capacity_and_locate(self):
+        c = ShardedColumns(self.paths, max_open=1)
+        try:
+            assert c.capacity == 25
+            shards, local = c.locate([0, 9, 10, 13, 24])
+            assert list(shards) == [0, 0, 1, 2, 2]
+            assert list(local) == [0, 9, 0, 0, 11]
+        finally:
+            c.close()
+
+    def test_get_batch_across_shards(self):
+        c = ShardedColumns(self.paths, max_open=2)
+        try:
+            indices = [24, 3, 11, 0, 12]
+            np.testing.assert_array_equal(c.get_batch(indices)['x'],
+                                          self.x[indices])
+            assert c[14]['x'] == 14
+            assert len(c._opened) <= 2
+        finally:
+            c.close()
+
+    def test_shuffled_indices_stay_in_shard(self):
+        c = ShardedColumns(self.paths, capacities=[10, 3, 12])
+        indices = c.shuffled_indices(seed=0)
+        assert sorted(indices) == list(range(25))
+        shards, _ = c.locate(indices)
+        assert np.count_nonzero(np.diff(shards)) == 2
+
+    def test_npy_shards(self):
+        paths = []
+        for i in range(2):
+            path = Path(self.tmp.name) / 'x.{}.npy'.format(i)
+            np.save(str(path), self.x[i * 5:(i + 1) * 5])
+            paths.append(path)
+        c = ShardedColumns(paths)
+        np.testing.assert_array_equal(
+            c.get_batch(slice(3, 7))[NPYDataColumns.K.DATA], self.x[3:7])
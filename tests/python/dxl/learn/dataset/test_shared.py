@@ -0,0 +1,88 @@
+from dxl.learn.dataset.shared import SharedColumns, segment_name
+from dxl.learn.dataset.data_column import HDF5DataColumns, NDArrayColumns
+from multiprocessing import shared_memory
+import multiprocessing as mp
+import json
+import os
+import numpy as np
+import h5py
+import tempfile
+import unittest
+import pytest
+from pathlib import Path
+
+
+def _attach_in_child(path, registry_dir, queue):
+    c = SharedColumns(HDF5DataColumns(path), registry_dir=registry_dir)
+    queue.put((c.is_creator, c.get_batch([2])['x'].tolist()))
+    c.close()
+
+
+def _exists(name):
+    try:
+        shared_memory.SharedMemory(name=name).close()
+        return True
+    except FileNotFoundError:
+        return False
+
+
+class TestSharedColumns(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.path = str(Path(self.tmp.name) / 'data.h5')
+        self.x = np.arange(20, dtype=np.float32).reshape([10, 2])
+        with h5py.File(self.path, 'w') as fout:
+            fout.create_dataset('x', data=self.x)
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def make(self):
+        return SharedColumns(
+            HDF5DataColumns(self.path), batch_size=3,
+            registry_dir=self.tmp.name)
+
+    def test_attach_and_release(self):
+        a, b = self.make(), self.make()
+        assert a.is_creator and not b.is_creator
+        np.testing.assert_array_equal(b.get_batch([3, 1])['x'],
+                                      self.x[[3, 1]])
+        assert b.capacity == 10
+        with pytest.raises(ValueError):
+            b.data['x'][0] = 1.0
+        a.close()
+        assert _exists(a.name)
+        b.close()
+        assert not _exists(a.name)
+
+    def test_attach_in_other_process(self):
+        c = self.make()
+        queue = mp.get_context('fork').Queue()
+        p = mp.get_context('fork').Process(
+            target=_attach_in_child,
+            args=(self.path, self.tmp.name, queue))
+        p.start()
+        assert queue.get(timeout=60) == (False, [[4.0, 5.0]])
+        p.join()
+        assert _exists(c.name)
+        c.close()
+        assert not _exists(c.name)
+
+    def test_prune_dead_users(self):
+        c = self.make()
+        registry = os.path.join(self.tmp.name, c.name + '.users')
+        with open(registry) as fin:
+            users = json.load(fin)
+        with open(registry, 'w') as fout:
+            json.dump(users + [2**22 + 1], fout)
+        c.close()
+        assert not _exists(c.name)
+
+    def test_key_required_without_file(self):
+        with pytest.raises(ValueError):
+            segment_name(NDArrayColumns({'x': self.x}))
+        c = SharedColumns(NDArrayColumns({'x': self.x}), key='x',
+                          registry_dir=self.tmp.name)
+        np.testing.assert_array_equal(c.get_batch(slice(0, 2))['x'],
+                                      self.x[:2])
+        c.close()
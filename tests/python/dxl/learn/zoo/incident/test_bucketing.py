@@ -0,0 +1,70 @@
+from dxl.learn.test import TestCase
+from dxl.learn.dataset.data_column import NDArrayColumns
+from dxl.learn.zoo.incident.bucketing import (bucketed_dataset,
+                                              default_bucket_boundaries,
+                                              unpad_hits)
+import numpy as np
+import tensorflow as tf
+
+
+class TestBucketing(TestCase):
+    def make_columns(self, nb_true_hits, padding_size):
+        hits = np.zeros([len(nb_true_hits), padding_size, 4], np.float32)
+        first = []
+        for i, n in enumerate(nb_true_hits):
+            # true hits first, padding at the end
+            hits[i, :n] = i + 1
+            first.append(n - 1)
+        return NDArrayColumns({
+            'hits': hits,
+            'first_hit_index': np.array(first, np.int64),
+            'padded_size': padding_size - np.array(nb_true_hits, np.int64),
+        })
+
+    def run_all(self, dataset):
+        x = tf.compat.v1.data.make_one_shot_iterator(dataset).get_next()
+        result = []
+        with self.test_session() as sess:
+            try:
+                while True:
+                    result.append(sess.run(x))
+            except tf.errors.OutOfRangeError:
+                pass
+        return result
+
+    def test_default_bucket_boundaries(self):
+        assert default_bucket_boundaries(10) == [2, 3, 5, 9, 11]
+        assert default_bucket_boundaries(8) == [2, 3, 5, 9]
+
+    def test_unpad_hits_drops_trailing_padding(self):
+        hits = np.array([[1] * 4, [2] * 4, [0] * 4, [0] * 4], np.float32)
+        result = unpad_hits(
+            tf.constant(hits), tf.constant(1), tf.constant(2, tf.int64))
+        with self.test_session() as sess:
+            result = sess.run(result)
+        np.testing.assert_array_equal(result['hits'], hits[:2])
+        assert result['nb_true_hits'] == 2
+
+    def test_bucketed_dataset(self):
+        padding_size = 10
+        nb_true_hits = [1, 3, 2, 7, 5, 10, 1, 2, 4, 9, 3, 6]
+        columns = self.make_columns(nb_true_hits, padding_size)
+        boundaries = default_bucket_boundaries(padding_size)
+        widths = [b - 1 for b in boundaries]
+        batches = self.run_all(
+            bucketed_dataset(columns, 2, False, padding_size, nb_epochs=1))
+        assert sum(len(b['hits']) for b in batches) == len(nb_true_hits)
+        for b in batches:
+            width = b['hits'].shape[1]
+            assert width in widths
+            true_hits = width - b['padded_size']
+            lower = [0] + boundaries
+            bucket = widths.index(width)
+            assert np.all(true_hits >= lower[bucket])
+            assert np.all(true_hits < boundaries[bucket])
+            assert b['first_hit_index'].shape == (len(b['hits']), width)
+            for i, n in enumerate(true_hits):
+                assert np.all(b['hits'][i, :n] > 0)
+                assert np.all(b['hits'][i, n:] == 0)
+                assert np.argmax(b['first_hit_index'][i]) == n - 1
+        assert any(b['hits'].shape[1] < padding_size for b in batches)